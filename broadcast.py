@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from config import BROADCAST_RATE, BROADCAST_BATCH_SIZE, BROADCAST_CONCURRENCY, BROADCAST_PROGRESS_INTERVAL
+from database import db
+from sender import sender, INTERACTIVE, BULK
+
+logger = logging.getLogger(__name__)
+
+
+def get_broadcast_cancel_kb(broadcast_id: int):
+    builder = InlineKeyboardBuilder()
+    builder.button(text="⛔ Зупинити", callback_data=f"bc_cancel_{broadcast_id}")
+    return builder.as_markup()
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class BroadcastJob:
+    """Одна розсилка: отримувачі читаються сторінками за курсором user_id, прогрес зберігається після кожної"""
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.chat_id = row['chat_id']
+        self.message_id = row['message_id']
+        self.text = row['text']
+        self.total = row['total']
+        self.cursor = row['cursor']
+        self.sent = row['sent']
+        self.failed = row['failed']
+        self.blocked = row['blocked']
+        self.cancelled = False
+        self._blocked_ids = []
+        self.started_at = time.monotonic()
+        self.started_done = self.done
+        self._slots = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self._launched = set()
+        # Текст останнього звіту: однаковий не редагуємо ("message is not modified")
+        self._last_report = None
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.blocked + len(self._blocked_ids)
+
+    def progress_text(self, status: str = 'running') -> str:
+        done = self.done
+        elapsed = time.monotonic() - self.started_at
+        speed = (done - self.started_done) / elapsed if elapsed > 0 else 0
+        percent = done * 100 // self.total if self.total else 100
+        lines = [
+            f"📣 <b>Розсилка #{self.id}</b>",
+            f"Відправлено: {self.sent} / {self.total} ({percent}%)",
+            f"Помилок: {self.failed}, заблокували бота: {self.blocked + len(self._blocked_ids)}",
+        ]
+        if status == 'running':
+            # Отримувачі, що підписались після старту, можуть зробити done > total
+            eta = format_eta(max(self.total - done, 0) / speed) if speed else "—"
+            lines.append(f"Швидкість: {speed:.1f} повід./с, залишилось ≈ {eta}")
+        elif status == 'done':
+            lines.append("✅ Завершено")
+        elif status == 'cancelled':
+            lines.append("⛔ Зупинено")
+        return "\n".join(lines)
+
+    async def _deliver(self, user_id: int):
+        try:
+            await sender.send(SendMessage(chat_id=user_id, text=self.text, parse_mode="HTML"), BULK)
+            self.sent += 1
+        except TelegramForbiddenError:
+            self._blocked_ids.append(user_id)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"SYSTEM: Broadcast #{self.id} failed for {user_id}: {e}")
+        finally:
+            self._slots.release()
+
+    async def _checkpoint(self, status: str = None):
+        blocked_ids, self._blocked_ids = self._blocked_ids, []
+        self.blocked += len(blocked_ids)
+        await db.save_broadcast_progress(self.id, self.cursor, self.sent, self.failed, blocked_ids,
+                                         status, self.message_id)
+
+    def _report(self, status: str = 'running'):
+        text = self.progress_text(status)
+        if text == self._last_report:
+            return
+        self._last_report = text
+        sender.enqueue(EditMessageText(
+            chat_id=self.chat_id, message_id=self.message_id, text=text, parse_mode="HTML",
+            reply_markup=get_broadcast_cancel_kb(self.id) if status == 'running' else None,
+        ), INTERACTIVE)
+
+    async def run(self):
+        if self.message_id is None:
+            self._last_report = self.progress_text()
+            message = await sender.send(SendMessage(chat_id=self.chat_id, text=self._last_report,
+                                                    reply_markup=get_broadcast_cancel_kb(self.id),
+                                                    parse_mode="HTML"))
+            self.message_id = message.message_id
+
+        loop = asyncio.get_running_loop()
+        interval = 1 / BROADCAST_RATE
+        next_at = loop.time()
+        last_report = loop.time()
+        status = 'running'
+        try:
+            while True:
+                user_ids = await db.get_broadcast_recipients(self.cursor, BROADCAST_BATCH_SIZE)
+                if not user_ids:
+                    status = 'done'
+                    break
+
+                for user_id in user_ids:
+                    # Рівномірний темп: не більше BROADCAST_RATE повідомлень за секунду
+                    delay = next_at - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_at = max(next_at, loop.time()) + interval
+
+                    await self._slots.acquire()
+                    task = asyncio.create_task(self._deliver(user_id))
+                    self._launched.add(task)
+                    task.add_done_callback(self._launched.discard)
+                    self.cursor = user_id
+
+                await asyncio.gather(*self._launched)
+                await self._checkpoint()
+                if loop.time() - last_report >= BROADCAST_PROGRESS_INTERVAL:
+                    last_report = loop.time()
+                    self._report()
+        except asyncio.CancelledError:
+            status = 'cancelled' if self.cancelled else 'running'
+            # Курсор стоїть на останньому запущеному отримувачі — дочікуємо відправки до нього
+            await asyncio.gather(*self._launched, return_exceptions=True)
+            raise
+        finally:
+            # 'running' після зупинки процесу означає "продовжити при наступному запуску"
+            await self._checkpoint(status)
+            if status != 'running':
+                logger.info(f"ADMIN_ACTION: Broadcast #{self.id} {status}: sent {self.sent}, "
+                            f"failed {self.failed}, blocked {self.blocked}.")
+            self._report(status)
+
+
+class BroadcastEngine:
+    """Запуск, зупинка та відновлення розсилок після перезапуску"""
+
+    def __init__(self):
+        self._jobs = {}
+
+    async def start(self, admin_id: int, chat_id: int, text: str) -> int:
+        broadcast_id = await db.create_broadcast(admin_id, chat_id, text)
+        logger.info(f"ADMIN_ACTION: Admin {admin_id} STARTED broadcast #{broadcast_id}.")
+        await self._launch(broadcast_id)
+        return broadcast_id
+
+    async def resume(self):
+        """Продовжує розсилки, перервані зупинкою процесу"""
+        for row in await db.get_running_broadcasts():
+            logger.info(f"SYSTEM: Resuming broadcast #{row['id']}.")
+            await self._launch(row['id'])
+
+    async def _launch(self, broadcast_id: int):
+        job = BroadcastJob(await db.get_broadcast(broadcast_id))
+        task = asyncio.create_task(job.run())
+        self._jobs[broadcast_id] = (job, task)
+        task.add_done_callback(lambda t: self._finished(broadcast_id, t))
+
+    def _finished(self, broadcast_id: int, task: asyncio.Task):
+        self._jobs.pop(broadcast_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"SYSTEM: Broadcast #{broadcast_id} stopped with error: {task.exception()}")
+
+    def cancel(self, broadcast_id: int) -> bool:
+        entry = self._jobs.get(broadcast_id)
+        if entry is None:
+            return False
+        job, task = entry
+        job.cancelled = True
+        task.cancel()
+        return True
+
+    async def stop(self):
+        """Зупиняє всі розсилки зі збереженням прогресу (вони продовжаться після запуску)"""
+        tasks = [task for _, task in self._jobs.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'running': len(self._jobs),
+            'sent': sum(job.sent for job, _ in self._jobs.values()),
+        }
+
+
+broadcasts = BroadcastEngine()
@@ -0,0 +1,65 @@
+from database import db
+from money import format_minor
+from rates import rates
+from texts import LEXICON
+
+
+class CartLine:
+    __slots__ = ('cart_id', 'product_id', 'name', 'quantity', 'unit_minor', 'line_minor')
+
+    def __init__(self, cart_id: int, product_id: int, name: str, quantity: int, unit_minor: int, line_minor: int):
+        self.cart_id = cart_id
+        self.product_id = product_id
+        self.name = name
+        self.quantity = quantity
+        self.unit_minor = unit_minor
+        self.line_minor = line_minor
+
+
+class CartSummary:
+    """
+    Підсумок кошика у валюті користувача, гроші — цілі мінорні одиниці. Ціна за одиницю береться
+    з таблиці цін поточних курсів (rates.price_minor), сума рядка — ціна за одиницю помножена
+    на кількість, загальна сума — сума рядків, тож кошик, рахунок і чек збігаються.
+    """
+    __slots__ = ('lines', 'currency', 'total_minor')
+
+    def __init__(self, lines: tuple, currency: str):
+        self.lines = lines
+        self.currency = currency
+        self.total_minor = sum(line.line_minor for line in lines)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def items_text(self) -> str:
+        return "\n".join(f"{line.name} x{line.quantity}" for line in self.lines)
+
+    def render(self, lang: str, sign: str) -> str:
+        unit = "/pcs" if lang == 'en' else "/шт"
+        parts = [LEXICON[lang]['cart_title']]
+        for line in self.lines:
+            line_total = format_minor(line.line_minor, self.currency)
+            if line.quantity > 1:
+                unit_price = format_minor(line.unit_minor, self.currency)
+                parts.append(f"• {line.name} x{line.quantity} = {line_total} {sign} ({unit_price}{unit})\n")
+            else:
+                parts.append(f"• {line.name} x{line.quantity} = {line_total} {sign}\n")
+        parts.append(f"\n💰 <b>Total: {format_minor(self.total_minor, self.currency)} {sign}</b>")
+        return "".join(parts)
+
+
+async def get_cart_summary(user_id: int, currency: str) -> CartSummary:
+    rows = await db.get_cart(user_id)
+    lines = []
+    for row in rows:
+        unit_minor = rates.price_minor(row['product_id'], row['price'], currency)
+        lines.append(CartLine(
+            cart_id=row['cart_id'],
+            product_id=row['product_id'],
+            name=row['name'],
+            quantity=row['quantity'],
+            unit_minor=unit_minor,
+            line_minor=unit_minor * row['quantity'],
+        ))
+    return CartSummary(tuple(lines), currency)
@@ -1,4 +1,6 @@
 import os
+import hashlib
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,6 +11,16 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 # Токен платіжної системи
 PAYMENT_TOKEN = os.getenv("PAYMENT_TOKEN")
 
+# --- WEBHOOK ---
+# Публічна адреса сервісу (https://...); якщо не задана — бот працює через polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет із заголовка X-Telegram-Bot-Api-Secret-Token. За замовчуванням виводиться з токена,
+# щоб усі репліки за балансувальником мали однакове значення
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or (
+    hashlib.sha256(BOT_TOKEN.encode()).hexdigest() if BOT_TOKEN else None
+)
+
 # --- АДМІНІСТРАТОРИ ---
 env_admins = os.getenv("ADMIN_IDS")
 if env_admins:
@@ -27,4 +39,123 @@ CURRENCY_SIGNS = {
     'UAH': 'UAH',
     'USD': '$',
     'EUR': '€'
-}
\ No newline at end of file
+}
+
+# Файл з актуальними курсами (JSON, {"USD": 41.5, ...}); без нього беруться EXCHANGE_RATES.
+# Курси перечитуються у фоні кожні RATES_REFRESH_INTERVAL секунд без перезапуску бота
+RATES_FILE = os.getenv("RATES_FILE")
+RATES_REFRESH_INTERVAL = float(os.getenv("RATES_REFRESH_INTERVAL", 300))
+
+# --- КАТАЛОГ ---
+# Кількість товарів на одній сторінці категорії
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", 10))
+
+# Кількість замовлень на одній сторінці адмін-списку
+ORDERS_PAGE_SIZE = int(os.getenv("ORDERS_PAGE_SIZE", 20))
+
+# Кількість замовлень на одній сторінці "Мої замовлення"
+ORDERS_HISTORY_PAGE_SIZE = int(os.getenv("ORDERS_HISTORY_PAGE_SIZE", 10))
+
+# --- INLINE-РЕЖИМ ---
+# Максимум результатів у відповіді на inline-запит
+INLINE_RESULTS_LIMIT = int(os.getenv("INLINE_RESULTS_LIMIT", 20))
+# Мінімальна довжина запиту (коротші не доходять до БД)
+INLINE_MIN_QUERY_LEN = int(os.getenv("INLINE_MIN_QUERY_LEN", 2))
+# Скільки секунд Telegram кешує відповідь для користувача
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 60))
+# Серверний кеш готових результатів: кількість записів і TTL (сек)
+INLINE_CACHE_SIZE = int(os.getenv("INLINE_CACHE_SIZE", 10_000))
+INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL", 300))
+
+
+# --- БАЗА ДАНИХ ---
+# Кількість довготривалих з'єднань у пулі та час очікування вільного з'єднання (сек)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 5))
+
+# Режим WAL: очікування блокування (мс), період фонового checkpoint (сек)
+# та розмір WAL-файлу, після якого checkpoint обрізає його (байти)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CHECKPOINT_INTERVAL = float(os.getenv("DB_CHECKPOINT_INTERVAL", 60))
+DB_WAL_TRUNCATE_BYTES = int(os.getenv("DB_WAL_TRUNCATE_BYTES", 64 * 1024 * 1024))
+
+# Групові коміти: максимум операцій в одній транзакції та максимальна затримка пакета (сек)
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 100))
+DB_WRITE_MAX_DELAY = float(os.getenv("DB_WRITE_MAX_DELAY", 0.005))
+
+# Кеш налаштувань користувачів (мова/валюта): максимум записів та час життя запису (сек)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 100_000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 600))
+# Кеш каталогу (категорії, сторінки, товари): максимум записів до наступної зміни каталогу
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 5000))
+
+# Профілювання запитів (можна змінити командою /dbprofile): запити, довші за DB_SLOW_QUERY_MS,
+# пишуться в лог з прихованими параметрами; DB_EXPLAIN — план кожної нової форми запиту
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 100))
+DB_EXPLAIN = os.getenv("DB_EXPLAIN", "0") == "1"
+
+# --- ВІДПРАВКА ПОВІДОМЛЕНЬ ---
+# Глобальний ліміт Telegram (~30 повідомлень/сек) із запасом та допустимий сплеск
+SEND_RATE = float(os.getenv("SEND_RATE", 25))
+SEND_BURST = float(os.getenv("SEND_BURST", 25))
+# Мінімальний інтервал між повідомленнями в один чат (сек): приватний чат / група
+SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", 1.0))
+SEND_GROUP_INTERVAL = float(os.getenv("SEND_GROUP_INTERVAL", 3.0))
+# Одночасних запитів до API, спроб на повідомлення, очікування черги при зупинці (сек)
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", 10))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 5))
+SEND_DRAIN_TIMEOUT = float(os.getenv("SEND_DRAIN_TIMEOUT", 10))
+
+# --- СПОВІЩЕННЯ АДМІНІВ ---
+# Скільки сповіщень про замовлення відправляються одночасно
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", 5))
+# Режим дайджесту: якщо за NOTIFY_DIGEST_WINDOW сек більше NOTIFY_DIGEST_THRESHOLD замовлень,
+# наступні надсилаються одним повідомленням наприкінці вікна (0 — вимкнено)
+NOTIFY_DIGEST_THRESHOLD = int(os.getenv("NOTIFY_DIGEST_THRESHOLD", 0))
+NOTIFY_DIGEST_WINDOW = float(os.getenv("NOTIFY_DIGEST_WINDOW", 60))
+
+# --- РОЗСИЛКИ ---
+# Темп розсилки (повідомлень/сек) — нижче за SEND_RATE, щоб лишався запас для відповідей користувачам
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 20))
+# Отримувачів на сторінку (після кожної прогрес зберігається в БД) та одночасних відправок
+BROADCAST_BATCH_SIZE = int(os.getenv("BROADCAST_BATCH_SIZE", 200))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 20))
+# Як часто оновлювати повідомлення з прогресом (сек)
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", 5))
+
+# --- ЛОГУВАННЯ ---
+LOG_FILE = os.getenv("LOG_FILE", "shop_actions.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Ротація: за часом (LOG_ROTATE_WHEN = "midnight", "H", ...) або за розміром файлу (LOG_MAX_BYTES)
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 20 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 10))
+# Черга записів до фонового потоку. Коли вона заповнена, записи нижче LOG_DROP_LEVEL
+# відкидаються, а решта чекає місця не довше LOG_BLOCK_TIMEOUT сек
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
+LOG_DROP_LEVEL = getattr(logging, os.getenv("LOG_DROP_LEVEL", "WARNING").upper(), logging.WARNING)
+LOG_BLOCK_TIMEOUT = float(os.getenv("LOG_BLOCK_TIMEOUT", 0.05))
+
+# --- FSM ---
+# Незавершені сценарії (оформлення замовлення, додавання товару) видаляються через FSM_TTL сек бездіяльності
+FSM_TTL = float(os.getenv("FSM_TTL", 7 * 24 * 3600))
+# Зміни станів скидаються в БД пакетами: раз на FSM_FLUSH_INTERVAL сек або при FSM_FLUSH_BATCH ключах
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", 0.5))
+FSM_FLUSH_BATCH = int(os.getenv("FSM_FLUSH_BATCH", 500))
+# Як часто прибирати прострочені стани (сек)
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", 3600))
+
+# --- МОНІТОРИНГ ---
+# Як часто вимірювати затримку циклу подій (сек) і за скільки останніх секунд рахувати перцентилі
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", 0.1))
+LOOP_LAG_WINDOW = float(os.getenv("LOOP_LAG_WINDOW", 60))
+# Якщо цикл не відповідає довше LOOP_STALL_THRESHOLD сек, у лог пишеться стек потоку циклу
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.5))
+# Межі для /ready: понад них екземпляр вважається перевантаженим (503)
+READY_DB_TIMEOUT = float(os.getenv("READY_DB_TIMEOUT", 1.0))
+READY_MAX_LOOP_LAG = float(os.getenv("READY_MAX_LOOP_LAG", 0.25))
+READY_MAX_SEND_QUEUE = int(os.getenv("READY_MAX_SEND_QUEUE", 1000))
+READY_MAX_PENDING_UPDATES = int(os.getenv("READY_MAX_PENDING_UPDATES", 500))
+# Як довго кешувати pending_update_count з getWebhookInfo (сек), щоб не запитувати API на кожну перевірку
+READY_WEBHOOK_INFO_TTL = float(os.getenv("READY_WEBHOOK_INFO_TTL", 30))
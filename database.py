@@ -1,14 +1,473 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
 import aiosqlite
 
+import migrations
+from db_profiler import profiler, current_method, bind_method
+from metrics import DB_METHOD_SECONDS, instrument_methods
+from search import build_fts_query
+from config import (
+    DB_POOL_SIZE, DB_ACQUIRE_TIMEOUT, DB_BUSY_TIMEOUT_MS, DB_CHECKPOINT_INTERVAL, DB_WAL_TRUNCATE_BYTES,
+    DB_WRITE_BATCH_SIZE, DB_WRITE_MAX_DELAY, USER_CACHE_SIZE, USER_CACHE_TTL, CATALOG_CACHE_SIZE,
+    CATALOG_PAGE_SIZE, ORDERS_PAGE_SIZE
+)
+
 DB_NAME = "shop.db"
 
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """Пул довготривалих з'єднань aiosqlite.
+
+    З'єднання відкриваються ліниво (до `size` штук) і перевикористовуються,
+    тому кожен запит не платить за новий потік та повторне відкриття файлу БД.
+    """
+
+    def __init__(self, db_name: str, size: int = 5, timeout: float = 5.0, pragmas=(), wrap=None):
+        self.db_name = db_name
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        # Обгортка нових з'єднань (профайлер запитів)
+        self.wrap = wrap
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._connections = []
+        self._reserved = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = True
+
+    async def open(self):
+        self._closed = False
+        # Перше з'єднання відкриваємо одразу, щоб помилки шляху/прав було видно на старті
+        self._reserved += 1
+        self._idle.put_nowait(await self._connect())
+
+    async def close(self):
+        self._closed = True
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        self._idle = asyncio.Queue()
+        self._reserved = 0
+
+    async def _connect(self):
+        conn = await aiosqlite.connect(self.db_name)
+        conn.row_factory = aiosqlite.Row
+        for pragma in self.pragmas:
+            await conn.execute(f"PRAGMA {pragma}")
+        if self.wrap is not None:
+            conn = self.wrap(conn)
+        self._connections.append(conn)
+        return conn
+
+    async def _discard(self, conn):
+        if conn in self._connections:
+            self._connections.remove(conn)
+            self._reserved -= 1
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def _get(self):
+        try:
+            return self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+
+        if self._reserved < self.size:
+            self._reserved += 1
+            try:
+                return await self._connect()
+            except Exception:
+                self._reserved -= 1
+                raise
+
+        self._waiting += 1
+        try:
+            return await asyncio.wait_for(self._idle.get(), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No free database connection after {self.timeout}s") from None
+        finally:
+            self._waiting -= 1
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is not open")
+
+        conn = await self._get()
+        self._in_use += 1
+        try:
+            yield conn
+        finally:
+            self._in_use -= 1
+            try:
+                # Незакомічена транзакція не повинна "протекти" до наступного користувача
+                if conn.in_transaction:
+                    await conn.rollback()
+            except Exception:
+                await self._discard(conn)
+            else:
+                if self._closed:
+                    await conn.close()
+                else:
+                    self._idle.put_nowait(conn)
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'opened': len(self._connections),
+            'in_use': self._in_use,
+            'waiting': self._waiting,
+        }
+
+
+class WriteQueue:
+    """Черга записів з груповими комітами.
+
+    Хендлери кладуть у чергу операцію `op(conn)` і чекають на future.
+    Єдина фонова задача забирає до `max_batch` операцій (чекаючи не довше
+    `max_delay` сек), виконує їх в одній транзакції і робить один commit.
+    Кожна операція обгорнута в SAVEPOINT, тож помилка однієї не скасовує інші.
+    Future завершується лише після commit, тому наступне читання того ж
+    користувача вже бачить його зміни.
+    """
+
+    def __init__(self, writer: ConnectionPool, max_batch: int = 100, max_delay: float = 0.005):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        self._batches = 0
+        self._ops = 0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дочікується виконання вже поставлених у чергу операцій і зупиняє задачу."""
+        if self._task:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    async def submit(self, op):
+        if self._task is None:
+            raise RuntimeError("Write queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((bind_method(op), future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'batches': self._batches,
+            'ops': self._ops,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._apply(batch)
+            if stopping:
+                return
+
+    async def _apply(self, batch):
+        results = []
+        try:
+            async with self.writer.acquire() as conn:
+                await conn.execute("BEGIN IMMEDIATE")
+                for op, future in batch:
+                    await conn.execute("SAVEPOINT write_op")
+                    try:
+                        result = await op(conn)
+                    except Exception as e:
+                        await conn.execute("ROLLBACK TO write_op")
+                        await conn.execute("RELEASE write_op")
+                        results.append((future, e))
+                    else:
+                        await conn.execute("RELEASE write_op")
+                        results.append((future, result))
+                await conn.commit()
+        except Exception as e:
+            # Транзакція не відбулась — жодна операція пакета не збережена
+            logger.error(f"SYSTEM: Write batch of {len(batch)} ops failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._batches += 1
+        self._ops += len(batch)
+        for future, result in results:
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class CatalogCache:
+    """Кеш каталогу в пам'яті процесу: категорії, сторінки товарів категорій та товари за id.
+
+    Каталог змінюється лише через add_product/delete_product, які після commit
+    викликають `invalidate()`. Кожна інвалідація збільшує `version`; значення,
+    прочитане з БД під час зміни каталогу, має стару версію і в кеш не потрапляє.
+    Ключі походять з callback_data, тому записів не більше `maxsize` —
+    найдавніше використаний витісняється.
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize: int = CATALOG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = 0
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return self.MISSING
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, version: int):
+        if version != self.version:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self.version += 1
+        self._items = OrderedDict()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'version': self.version,
+            'entries': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+class LRUCache:
+    """Обмежений LRU-кеш із TTL.
+
+    Містить не більше `maxsize` записів: найдавніше використаний витісняється,
+    а запис старший за `ttl` сек вважається промахом. Як і в CatalogCache,
+    `put` з переданою `version` ігнорується, якщо між читанням з БД і `put`
+    відбувся запис (`set`/`pop`) — так конкурентне читання не поверне в кеш застарілі дані.
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return self.MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return self.MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, version: int = None):
+        if version is not None and version != self.version:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value):
+        """Запис після зміни в БД (write-through)."""
+        self.version += 1
+        self.put(key, value)
+
+    def pop(self, key):
+        self.version += 1
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
 
 class Database:
-    def __init__(self):
-        self.db_name = DB_NAME
+    """Доступ до БД магазину.
+
+    SQLite працює в режимі WAL: читання йдуть через пул з'єднань `readers`
+    (лише для читання), а всі зміни — через єдине з'єднання `writer`,
+    тому перегляд каталогу не блокується записами кошика.
+    Зміни з хендлерів проходять через `WriteQueue` з груповими комітами.
+    """
+
+    def __init__(self, db_name: str = DB_NAME):
+        self.db_name = db_name
+        self.writer = ConnectionPool(db_name, size=1, timeout=DB_ACQUIRE_TIMEOUT, pragmas=(
+            "journal_mode = WAL",
+            "synchronous = NORMAL",
+            f"busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+        ), wrap=profiler.wrap)
+        self.readers = ConnectionPool(db_name, size=DB_POOL_SIZE, timeout=DB_ACQUIRE_TIMEOUT, pragmas=(
+            "query_only = ON",
+            f"busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+        ), wrap=profiler.wrap)
+        self.writes = WriteQueue(self.writer, max_batch=DB_WRITE_BATCH_SIZE, max_delay=DB_WRITE_MAX_DELAY)
+        self.catalog = CatalogCache()
+        self.user_settings = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        self._checkpoint_task = None
+
+    async def connect(self):
+        """Відкриває з'єднання. Викликається один раз при старті бота."""
+        # Writer першим: він переводить файл БД у WAL до того, як підключаться читачі
+        await self.writer.open()
+        await self.readers.open()
+        self.writes.start()
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def close(self):
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = None
+        await self.writes.stop()
+        await self.readers.close()
+        await self.writer.close()
+
+    def pool_stats(self) -> dict:
+        return {'readers': self.readers.stats(), 'writer': self.writer.stats()}
+
+    async def ping(self):
+        """Найпростіший запит через пул читачів (перевірка готовності)"""
+        await self._fetchone("SELECT 1")
+
+    async def checkpoint(self):
+        """Переносить WAL у файл БД. Якщо WAL завеликий — ще й обрізає його до нуля."""
+        try:
+            wal_size = os.path.getsize(f"{self.db_name}-wal")
+        except OSError:
+            wal_size = 0
+        mode = "TRUNCATE" if wal_size > DB_WAL_TRUNCATE_BYTES else "PASSIVE"
+        async with self.writer.acquire() as conn:
+            async with conn.execute(f"PRAGMA wal_checkpoint({mode})") as cursor:
+                busy, wal_pages, moved_pages = await cursor.fetchone()
+        if busy:
+            logger.warning(f"SYSTEM: WAL checkpoint ({mode}) was blocked by readers: {moved_pages}/{wal_pages} pages.")
+        return mode, wal_pages, moved_pages
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(DB_CHECKPOINT_INTERVAL)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.error(f"SYSTEM: WAL checkpoint failed: {e}")
+
+    async def _fetchone(self, query: str, params=()):
+        async with self.readers.acquire() as conn:
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchone()
+
+    async def _fetchall(self, query: str, params=()):
+        async with self.readers.acquire() as conn:
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def _cached(self, key, loader):
+        """Повертає значення з кешу каталогу, а при промаху — завантажує з БД і кешує.
+        Відсутні записи (None) не кешуються: інакше довільні id з callback_data займали б кеш."""
+        value, _ = await self._cached_versioned(key, loader)
+        return value
+
+    async def _cached_versioned(self, key, loader):
+        """
+        (значення, версія каталогу, якій воно відповідає). Якщо каталог змінився під час
+        завантаження з БД, версія — None: значення не можна мемоізувати ні під старою, ні під новою.
+        """
+        value = self.catalog.get(key)
+        if value is not CatalogCache.MISSING:
+            # Інвалідація очищає кеш, тож влучання завжди належить поточній версії
+            return value, self.catalog.version
+
+        version = self.catalog.version
+        value = await loader()
+        if value is not None:
+            self.catalog.put(key, value, version)
+        return value, version if version == self.catalog.version else None
 
     async def create_tables(self):
-        async with aiosqlite.connect(self.db_name) as db:
+        async with self.writer.acquire() as db:
             # 1. Таблиця користувачів
             await db.execute("""
                              CREATE TABLE IF NOT EXISTS users
@@ -160,158 +619,349 @@ class Database:
 
             await db.commit()
 
+            # Індекси та інші зміни схеми — через версійовані міграції
+            await migrations.apply(db)
+
     # --- КОРИСТУВАЧІ ---
     async def add_user(self, user_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
-            await db.commit()
+        async def op(conn):
+            cursor = await conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+            if not cursor.rowcount:
+                # Користувач, який заблокував бота, повернувся — знову отримуватиме розсилки
+                await conn.execute("UPDATE users SET is_blocked = 0 WHERE user_id = ? AND is_blocked = 1", (user_id,))
+            return cursor.rowcount
+
+        if await self.writes.submit(op):
+            # Новий користувач — значення за замовчуванням відомі без читання з БД
+            self.user_settings.set(user_id, ('ua', 'UAH'))
 
     async def set_user_language(self, user_id: int, lang: str):
         """Встановлює мову. Якщо користувача немає — створює його."""
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
-            exists = await cursor.fetchone()
+        async def op(conn):
+            async with conn.execute("""
+                                    INSERT INTO users (user_id, language, currency)
+                                    VALUES (?, ?, 'UAH')
+                                    ON CONFLICT(user_id) DO UPDATE SET language = excluded.language
+                                    RETURNING language, currency
+                                    """, (user_id, lang)) as cursor:
+                return await cursor.fetchone()
 
-            if exists:
-                await db.execute("UPDATE users SET language = ? WHERE user_id = ?", (lang, user_id))
-            else:
-                await db.execute("INSERT INTO users (user_id, language, currency) VALUES (?, ?, 'UAH')",
-                                 (user_id, lang))
-            await db.commit()
+        row = await self.writes.submit(op)
+        self.user_settings.set(user_id, (row['language'], row['currency']))
 
     async def get_user_settings(self, user_id: int):
         """Повертає мову та валюту користувача"""
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT language, currency FROM users WHERE user_id = ?", (user_id,)) as cursor:
-                res = await cursor.fetchone()
-                if res:
-                    return res['language'], res['currency']
-                return 'ua', 'UAH'
+        settings = self.user_settings.get(user_id)
+        if settings is not LRUCache.MISSING:
+            return settings
+
+        version = self.user_settings.version
+        res = await self._fetchone("SELECT language, currency FROM users WHERE user_id = ?", (user_id,))
+        settings = (res['language'], res['currency']) if res else ('ua', 'UAH')
+        self.user_settings.put(user_id, settings, version)
+        return settings
 
     async def set_user_currency(self, user_id: int, currency: str):
         """Встановлює валюту. Якщо користувача немає — створює його."""
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
-            exists = await cursor.fetchone()
+        async def op(conn):
+            async with conn.execute("""
+                                    INSERT INTO users (user_id, language, currency)
+                                    VALUES (?, 'ua', ?)
+                                    ON CONFLICT(user_id) DO UPDATE SET currency = excluded.currency
+                                    RETURNING language, currency
+                                    """, (user_id, currency)) as cursor:
+                return await cursor.fetchone()
 
-            if exists:
-                await db.execute("UPDATE users SET currency = ? WHERE user_id = ?", (currency, user_id))
-            else:
-                await db.execute("INSERT INTO users (user_id, language, currency) VALUES (?, 'ua', ?)",
-                                 (user_id, currency))
-            await db.commit()
+        row = await self.writes.submit(op)
+        self.user_settings.set(user_id, (row['language'], row['currency']))
 
     # --- ТОВАРИ ---
     async def get_categories(self):
-        async with aiosqlite.connect(self.db_name) as db:
-            async with db.execute("SELECT DISTINCT category FROM products") as cursor:
-                return [row[0] for row in await cursor.fetchall()]
-
-    async def get_products_by_category(self, category: str):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM products WHERE category = ?", (category,)) as cursor:
-                return await cursor.fetchall()
+        categories, _ = await self.get_categories_versioned()
+        return categories
+
+    async def get_categories_versioned(self):
+        """(категорії, версія каталогу) — для клавіатур, мемоізованих за версією"""
+        async def load():
+            rows = await self._fetchall("SELECT DISTINCT category FROM products")
+            return tuple(row[0] for row in rows)
+
+        return await self._cached_versioned(('categories',), load)
+
+    async def get_products_page(self, category: str, after_id: int = 0, before_id: int = None,
+                                limit: int = CATALOG_PAGE_SIZE):
+        """
+        Сторінка товарів категорії за ключем (category, id): лише id, name, price.
+        Вперед — товари з id > after_id, назад — з id < before_id.
+        Повертає (rows, has_prev, has_next).
+        Категорія і курсор приходять з callback_data: невідома категорія дає порожню сторінку,
+        а курсор, що не є товаром цієї категорії, — першу сторінку (нових записів у кеші немає).
+        """
+        if category not in await self.get_categories():
+            return (), False, False
+        cursor_id = before_id if before_id is not None else after_id
+        if cursor_id:
+            product = await self.get_product(cursor_id)
+            if product is None or product['category'] != category:
+                after_id, before_id = 0, None
+
+        if before_id is not None:
+            key = ('page', category, 'before', before_id, limit)
+            query = """
+                    SELECT id, name, price FROM products
+                    WHERE category = ? AND id < ?
+                    ORDER BY id DESC LIMIT ?
+                    """
+            params = (category, before_id, limit + 1)
+        else:
+            key = ('page', category, 'after', after_id, limit)
+            query = """
+                    SELECT id, name, price FROM products
+                    WHERE category = ? AND id > ?
+                    ORDER BY id LIMIT ?
+                    """
+            params = (category, after_id, limit + 1)
+
+        async def load():
+            rows = await self._fetchall(query, params)
+            # Зайвий (limit + 1)-й рядок лише показує, що далі є ще товари
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            if before_id is not None:
+                return tuple(reversed(rows)), has_more, True
+            return tuple(rows), after_id > 0, has_more
+
+        return await self._cached(key, load)
+
+    async def search_products(self, query: str, offset: int = 0, limit: int = CATALOG_PAGE_SIZE):
+        """
+        Повнотекстовий пошук (FTS5) за назвою, описом і категорією з ранжуванням bm25.
+        query — нормалізований запит (search.normalize_query). Повертає (rows, has_more).
+        """
+        if not query:
+            return (), False
+        rows = await self._fetchall("""
+                                    SELECT p.id, p.name, p.price
+                                    FROM products_fts f
+                                             JOIN products p ON p.id = f.rowid
+                                    WHERE products_fts MATCH ?
+                                    ORDER BY f.rank
+                                    LIMIT ? OFFSET ?
+                                    """, (build_fts_query(query), limit + 1, offset))
+        return tuple(rows[:limit]), len(rows) > limit
 
     async def get_product(self, product_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM products WHERE id = ?", (product_id,)) as cursor:
-                return await cursor.fetchone()
+        return await self._cached(
+            ('product', product_id),
+            lambda: self._fetchone("SELECT * FROM products WHERE id = ?", (product_id,))
+        )
 
     async def add_product(self, name: str, desc: str, price: int, category: str):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("INSERT INTO products (name, desc, price, category) VALUES (?, ?, ?, ?)",
-                             (name, desc, price, category))
-            await db.commit()
+        async def op(conn):
+            await conn.execute("INSERT INTO products (name, desc, price, category) VALUES (?, ?, ?, ?)",
+                               (name, desc, price, category))
+
+        await self.writes.submit(op)
+        self.catalog.invalidate()
 
     async def delete_product(self, product_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("DELETE FROM products WHERE id = ?", (product_id,))
-            await db.execute("DELETE FROM cart WHERE product_id = ?", (product_id,))
-            await db.commit()
+        async def op(conn):
+            await conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            await conn.execute("DELETE FROM cart WHERE product_id = ?", (product_id,))
+
+        await self.writes.submit(op)
+        self.catalog.invalidate()
+
+    async def get_product_prices(self):
+        return await self._fetchall("SELECT id, price FROM products")
 
     async def get_all_products(self):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM products") as cursor:
-                return await cursor.fetchall()
+        return await self._fetchall("SELECT * FROM products")
 
     # --- КОШИК ---
     async def add_to_cart(self, user_id: int, product_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute("SELECT quantity FROM cart WHERE user_id = ? AND product_id = ?",
-                                      (user_id, product_id))
-            item = await cursor.fetchone()
-
-            if item:
-                await db.execute("UPDATE cart SET quantity = quantity + 1 WHERE user_id = ? AND product_id = ?",
-                                 (user_id, product_id))
-            else:
-                await db.execute("INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, 1)",
-                                 (user_id, product_id))
-            await db.commit()
+        async def op(conn):
+            # Унікальний індекс cart(user_id, product_id) дозволяє обійтись одним UPSERT
+            await conn.execute("""
+                               INSERT INTO cart (user_id, product_id, quantity)
+                               VALUES (?, ?, 1)
+                               ON CONFLICT(user_id, product_id) DO UPDATE SET quantity = quantity + 1
+                               """, (user_id, product_id))
+
+        await self.writes.submit(op)
 
     async def get_cart(self, user_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            query = """
-                    SELECT c.id as cart_id, c.quantity, p.name, p.price, p.id as product_id
-                    FROM cart c
-                             JOIN products p ON c.product_id = p.id
-                    WHERE c.user_id = ? \
-                    """
-            async with db.execute(query, (user_id,)) as cursor:
-                return await cursor.fetchall()
+        """Позиції кошика з назвою та ціною товару (в гривнях) — одним запитом; суми рахує cart.get_cart_summary"""
+        query = """
+                SELECT c.id         AS cart_id,
+                       c.quantity,
+                       p.name,
+                       p.price,
+                       p.id         AS product_id
+                FROM cart c
+                         JOIN products p ON c.product_id = p.id
+                WHERE c.user_id = ?
+                ORDER BY c.id
+                """
+        return await self._fetchall(query, (user_id,))
 
     async def delete_from_cart(self, cart_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("DELETE FROM cart WHERE id = ?", (cart_id,))
-            await db.commit()
+        async def op(conn):
+            await conn.execute("DELETE FROM cart WHERE id = ?", (cart_id,))
+
+        await self.writes.submit(op)
 
     async def clear_cart(self, user_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("DELETE FROM cart WHERE user_id = ?", (user_id,))
-            await db.commit()
+        async def op(conn):
+            await conn.execute("DELETE FROM cart WHERE user_id = ?", (user_id,))
+
+        await self.writes.submit(op)
 
     # --- ЗАМОВЛЕННЯ ---
     async def add_order(self, data: dict):
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute("""
-                                      INSERT INTO orders (user_id, user_name, user_phone, user_address, delivery_method,
-                                                          items_text, total_price, currency_code, status)
-                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                                      """, (
-                                          data['user_id'], data['user_name'], data['user_phone'], data['user_address'],
-                                          data['delivery_method'], data['items_text'], data['total_price'],
-                                          data['currency_code'], data['status']
-                                      ))
-            await db.commit()
+        async def op(conn):
+            cursor = await conn.execute("""
+                                        INSERT INTO orders (user_id, user_name, user_phone, user_address,
+                                                            delivery_method, items_text, total_price,
+                                                            currency_code, status)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                        """, (
+                                            data['user_id'], data['user_name'], data['user_phone'],
+                                            data['user_address'], data['delivery_method'], data['items_text'],
+                                            data['total_price'], data['currency_code'], data['status']
+                                        ))
             return cursor.lastrowid
 
-    async def get_orders(self, limit=10):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM orders ORDER BY id DESC LIMIT ?", (limit,)) as cursor:
-                return await cursor.fetchall()
-
-    async def get_user_orders(self, user_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM orders WHERE user_id = ? ORDER BY id DESC", (user_id,)) as cursor:
-                return await cursor.fetchall()
+        return await self.writes.submit(op)
+
+    async def get_orders_page(self, status: str = None, before_id: int = None, after_id: int = None,
+                              limit: int = ORDERS_PAGE_SIZE):
+        """
+        Сторінка списку замовлень (від новіших до старіших) з необов'язковим фільтром за статусом.
+        before_id — старіші за курсор, after_id — новіші за курсор. Вибираються лише колонки списку.
+        Повертає (rows, has_newer, has_older). Наявність замовлень по інший бік курсора перевіряється
+        запитом: за курсором могло нічого не лишитися (замовлення змінило статус).
+        """
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        filters = list(zip(conditions, params))
+
+        newer = after_id is not None
+        if newer:
+            conditions.append("id > ?")
+            params.append(after_id)
+        elif before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ASC" if newer else "DESC"
+        rows = await self._fetchall(
+            f"SELECT id, status, total_price, currency_code FROM orders {where} ORDER BY id {order} LIMIT ?",
+            (*params, limit + 1)
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newer:
+            return tuple(reversed(rows)), has_more, await self._orders_exist(filters, "id <= ?", after_id)
+        if before_id is None:
+            return tuple(rows), False, has_more
+        return tuple(rows), await self._orders_exist(filters, "id >= ?", before_id), has_more
+
+    async def _orders_exist(self, filters: list, condition: str, cursor_id: int) -> bool:
+        conditions = [c for c, _ in filters] + [condition]
+        params = [p for _, p in filters] + [cursor_id]
+        row = await self._fetchone(
+            f"SELECT EXISTS(SELECT 1 FROM orders WHERE {' AND '.join(conditions)})", params
+        )
+        return bool(row[0])
+
+    async def iter_user_orders(self, user_id: int, before_id: int = None, limit: int = -1):
+        """
+        Потоково віддає замовлення користувача від новіших до старіших (курсор — before_id).
+        З'єднання зайняте, поки генератор не вичерпано або не закрито — використовуйте aclosing().
+        """
+        query = """
+                SELECT id, status, total_price, currency_code, delivery_method, items_text
+                FROM orders
+                WHERE user_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+                """
+        params = (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit)
+        async with self.readers.acquire() as conn:
+            async with conn.execute(query, params) as cursor:
+                async for row in cursor:
+                    yield row
 
     async def get_order(self, order_id: int):
-        async with aiosqlite.connect(self.db_name) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM orders WHERE id = ?", (order_id,)) as cursor:
-                return await cursor.fetchone()
+        return await self._fetchone("SELECT * FROM orders WHERE id = ?", (order_id,))
 
     async def update_order_status(self, order_id: int, status: str):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
-            await db.commit()
+        async def op(conn):
+            await conn.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
+
+        await self.writes.submit(op)
+
+    # --- РОЗСИЛКИ ---
+    async def create_broadcast(self, admin_id: int, chat_id: int, text: str) -> int:
+        """Створює задачу розсилки всім незаблокованим користувачам"""
+        async def op(conn):
+            cursor = await conn.execute("""
+                                        INSERT INTO broadcasts (admin_id, chat_id, text, total)
+                                        VALUES (?, ?, ?, (SELECT COUNT(*) FROM users WHERE is_blocked = 0))
+                                        """, (admin_id, chat_id, text))
+            return cursor.lastrowid
 
+        return await self.writes.submit(op)
+
+    async def get_broadcast(self, broadcast_id: int):
+        return await self._fetchone("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+
+    async def get_running_broadcasts(self):
+        """Розсилки, не завершені до зупинки процесу"""
+        return await self._fetchall("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")
+
+    async def get_broadcast_recipients(self, after_user_id: int, limit: int):
+        """Наступна сторінка отримувачів розсилки (keyset за user_id)"""
+        rows = await self._fetchall("""
+                                    SELECT user_id
+                                    FROM users
+                                    WHERE user_id > ?
+                                      AND is_blocked = 0
+                                    ORDER BY user_id
+                                    LIMIT ?
+                                    """, (after_user_id, limit))
+        return [row['user_id'] for row in rows]
+
+    async def save_broadcast_progress(self, broadcast_id: int, cursor: int, sent: int, failed: int,
+                                      blocked_ids=(), status: str = None, message_id: int = None):
+        """
+        Зберігає прогрес розсилки і позначає користувачів, що заблокували бота, однією транзакцією.
+        """
+        async def op(conn):
+            await conn.execute("""
+                               UPDATE broadcasts
+                               SET cursor      = ?,
+                                   sent        = ?,
+                                   failed      = ?,
+                                   blocked     = blocked + ?,
+                                   status      = COALESCE(?, status),
+                                   message_id  = COALESCE(?, message_id),
+                                   updated_at  = CURRENT_TIMESTAMP
+                               WHERE id = ?
+                               """, (cursor, sent, failed, len(blocked_ids), status, message_id, broadcast_id))
+            if blocked_ids:
+                await conn.executemany("UPDATE users SET is_blocked = 1 WHERE user_id = ?",
+                                       [(user_id,) for user_id in blocked_ids])
+
+        await self.writes.submit(op)
+
+
+# Час виконання кожного публічного методу потрапляє в метрику shop_db_method_seconds
+instrument_methods(Database, DB_METHOD_SECONDS, current_method)
 
 db = Database()
\ No newline at end of file
@@ -0,0 +1,316 @@
+import contextlib
+import contextvars
+import logging
+import re
+import time
+
+import aiosqlite
+from aiosqlite.context import contextmanager
+
+from config import DB_PROFILE, DB_SLOW_QUERY_MS, DB_EXPLAIN
+from metrics import registry, Counter
+
+logger = logging.getLogger(__name__)
+
+# Публічний метод Database, що зараз виконується (встановлює instrument_methods)
+current_method = contextvars.ContextVar('db_method', default=None)
+
+QUERY_SECONDS = registry.register(Counter(
+    "shop_db_query_seconds_total", "Time spent executing SQL and fetching rows, by Database method", ("method",)))
+QUERIES_TOTAL = registry.register(Counter(
+    "shop_db_queries_total", "SQL statements executed by Database method", ("method",)))
+ROWS_TOTAL = registry.register(Counter(
+    "shop_db_rows_total", "Rows read or changed by Database method", ("method",)))
+
+# Службові інструкції не профілюються
+_SKIP_RE = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|EXPLAIN)\b", re.IGNORECASE)
+_EXPLAINABLE_RE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+# Рядки плану: "SCAN <таблиця> [USING ... INDEX ...]" та CTE/підзапити, що теж показуються як SCAN
+_PLAN_SCAN_RE = re.compile(r"^SCAN (\S+)(.*)$")
+_PLAN_CTE_RE = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+_ORDER_LIMIT_RE = re.compile(r"\bORDER\s+BY\b.*\bLIMIT\b", re.IGNORECASE | re.DOTALL)
+
+# Скільки різних форм запитів пам'ятати для EXPLAIN
+MAX_PLANS = 1000
+
+
+def normalize_sql(sql: str) -> str:
+    return _SPACES_RE.sub(" ", sql).strip()
+
+
+def top_level(sql: str) -> str:
+    """Текст запиту без вмісту дужок (підзапитів, CTE, списків аргументів) і рядкових літералів"""
+    out, depth, quote = [], 0, None
+    for ch in sql:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out)
+
+
+def find_full_scans(sql: str, details) -> list:
+    """
+    Рядки плану з повним проходом таблиці. Не рахуються: прохід за індексом (USING ... INDEX),
+    підзапити й CTE, віртуальні таблиці (FTS) та прохід у порядку rowid/індексу з ORDER BY ... LIMIT,
+    який зупиняється після LIMIT рядків (немає "USE TEMP B-TREE"). ORDER BY ... LIMIT враховується
+    лише у зовнішньому запиті: LIMIT підзапиту не обмежує прохід зовнішньої таблиці.
+    """
+    if _ORDER_LIMIT_RE.search(top_level(sql)) and not any(d.startswith("USE TEMP B-TREE") for d in details):
+        return []
+    materialized = {m.group(1) for m in map(_PLAN_CTE_RE.match, details) if m}
+    scans = []
+    for detail in details:
+        match = _PLAN_SCAN_RE.match(detail)
+        if match is None:
+            continue
+        name, rest = match.groups()
+        if name.startswith("(") or name == "CONSTANT" or name in materialized:
+            continue
+        if " USING " in rest or "VIRTUAL TABLE" in rest:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def redact(params):
+    """Параметри запиту без значень: лише тип (і довжина для рядків)"""
+    def placeholder(value):
+        if value is None:
+            return None
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__}:{len(value)}>"
+        return f"<{type(value).__name__}>"
+
+    if not params:
+        return []
+    if isinstance(params, dict):
+        return {key: placeholder(value) for key, value in params.items()}
+    return [placeholder(value) for value in params]
+
+
+def bind_method(op):
+    """Зберігає назву методу для операції, що виконається в задачі черги записів"""
+    method = current_method.get()
+
+    async def bound(conn):
+        token = current_method.set(method)
+        try:
+            return await op(conn)
+        finally:
+            current_method.reset(token)
+
+    return bound
+
+
+@contextlib.contextmanager
+def profiled_as(method: str):
+    """Мітка для запитів, що виконуються не з методів Database (наприклад, сховище FSM)"""
+    token = current_method.set(method)
+    try:
+        yield
+    finally:
+        current_method.reset(token)
+
+
+class MethodStats:
+    __slots__ = ('queries', 'seconds', 'rows', 'slow')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.slow = 0
+
+
+class ProfiledQuery:
+    """Один виконаний запит: час і рядки накопичуються, поки з курсора читають результат"""
+    __slots__ = ('profiler', 'method', 'sql', 'params', 'seconds', 'rows', 'reported')
+
+    def __init__(self, profiler, method: str, sql: str, params):
+        self.profiler = profiler
+        self.method = method
+        self.sql = sql
+        self.params = params
+        self.seconds = 0.0
+        self.rows = 0
+        self.reported = False
+        profiler.count_query(method)
+
+    def add(self, seconds: float, rows: int):
+        self.seconds += seconds
+        self.rows += rows
+        self.profiler.account(self.method, seconds, rows)
+
+    def finish(self):
+        """Результат прочитано (або курсор закрито) — перевіряємо поріг повільного запиту"""
+        if not self.reported and self.seconds * 1000 >= self.profiler.slow_ms:
+            self.reported = True
+            self.profiler.slow_query(self)
+
+
+class ProfiledCursor(aiosqlite.Cursor):
+    def __init__(self, conn: aiosqlite.Connection, cursor, query: ProfiledQuery):
+        super().__init__(conn, cursor)
+        self._query = query
+
+    async def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = await fetch(*args)
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        self._query.add(time.perf_counter() - start, rows)
+        return result
+
+    async def fetchone(self):
+        row = await self._timed_fetch(super().fetchone)
+        self._query.finish()
+        return row
+
+    async def fetchmany(self, size=None):
+        rows = await self._timed_fetch(super().fetchmany, size)
+        # Неповна сторінка — результат вичерпано
+        if len(rows) < (size or self.arraysize):
+            self._query.finish()
+        return rows
+
+    async def fetchall(self):
+        rows = await self._timed_fetch(super().fetchall)
+        self._query.finish()
+        return rows
+
+    async def close(self):
+        self._query.finish()
+        await super().close()
+
+
+class ProfiledConnection:
+    """Обгортка з'єднання aiosqlite: execute/executemany проходять через профайлер, решта — без змін"""
+
+    def __init__(self, conn: aiosqlite.Connection, profiler: "QueryProfiler"):
+        self._conn = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @contextmanager
+    async def execute(self, sql: str, parameters=None):
+        profiler = self._profiler
+        if not profiler.enabled or _SKIP_RE.match(sql):
+            return await self._conn.execute(sql, parameters)
+
+        start = time.perf_counter()
+        cursor = await self._conn.execute(sql, parameters)
+        query = ProfiledQuery(profiler, current_method.get() or 'unknown', sql, parameters)
+        query.add(time.perf_counter() - start, max(cursor.rowcount, 0))
+        if cursor.description is None:
+            # Запит без результату (INSERT/UPDATE/DELETE) уже виконано повністю
+            query.finish()
+        if profiler.explain:
+            await profiler.capture_plan(self._conn, query)
+        return ProfiledCursor(self._conn, cursor._cursor, query)
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters):
+        profiler = self._profiler
+        if not profiler.enabled:
+            return await self._conn.executemany(sql, parameters)
+
+        parameters = list(parameters)
+        start = time.perf_counter()
+        cursor = await self._conn.executemany(sql, parameters)
+        query = ProfiledQuery(profiler, current_method.get() or 'unknown', sql,
+                              parameters[0] if parameters else ())
+        query.add(time.perf_counter() - start, max(cursor.rowcount, 0))
+        query.finish()
+        return cursor
+
+
+class QueryProfiler:
+    """
+    Профілювання запитів Database: час і кількість рядків за методом, журнал повільних
+    запитів (параметри приховано) та EXPLAIN QUERY PLAN при першому виконанні кожної форми запиту.
+    Усі перемикачі можна змінювати під час роботи.
+    """
+
+    def __init__(self, enabled: bool = DB_PROFILE, slow_ms: float = DB_SLOW_QUERY_MS, explain: bool = DB_EXPLAIN):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.explain = explain
+        self.methods = {}
+        # Форма запиту -> (метод, рядки плану, рядки з повним проходом)
+        self.plans = {}
+
+    def wrap(self, conn: aiosqlite.Connection) -> ProfiledConnection:
+        return ProfiledConnection(conn, self)
+
+    def _method_stats(self, method: str) -> MethodStats:
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats()
+        return stats
+
+    def count_query(self, method: str):
+        self._method_stats(method).queries += 1
+        QUERIES_TOTAL.inc(method)
+
+    def account(self, method: str, seconds: float, rows: int):
+        stats = self._method_stats(method)
+        stats.seconds += seconds
+        QUERY_SECONDS.inc(method, value=seconds)
+        if rows:
+            stats.rows += rows
+            ROWS_TOTAL.inc(method, value=rows)
+
+    def slow_query(self, query: ProfiledQuery):
+        self.methods[query.method].slow += 1
+        ms = query.seconds * 1000
+        logger.warning(
+            f"SLOW_QUERY: {query.method} took {ms:.1f} ms ({query.rows} rows): "
+            f"{normalize_sql(query.sql)} params={redact(query.params)}",
+            extra={'latency_ms': round(ms, 1)}
+        )
+
+    async def capture_plan(self, conn: aiosqlite.Connection, query: ProfiledQuery):
+        shape = normalize_sql(query.sql)
+        if shape in self.plans or len(self.plans) >= MAX_PLANS or not _EXPLAINABLE_RE.match(shape):
+            return
+        try:
+            async with conn.execute(f"EXPLAIN QUERY PLAN {query.sql}", query.params or ()) as cursor:
+                details = [row[3] for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.debug(f"SYSTEM: EXPLAIN failed for {shape}: {e}")
+            return
+
+        scans = find_full_scans(shape, details)
+        self.plans[shape] = (query.method, details, scans)
+        if not details:
+            # INSERT ... VALUES без підзапитів плану не має
+            return
+        plan_text = "; ".join(details)
+        if scans:
+            logger.warning(f"FULL_SCAN: {query.method}: {shape} -> {plan_text}")
+        else:
+            logger.info(f"QUERY_PLAN: {query.method}: {shape} -> {plan_text}")
+
+    def full_scans(self):
+        """[(метод, запит, план)] для запитів, у плані яких є повний прохід таблиці"""
+        return [(method, shape, details) for shape, (method, details, scans) in self.plans.items() if scans]
+
+    def top(self, limit: int = 10):
+        return sorted(self.methods.items(), key=lambda item: item[1].seconds, reverse=True)[:limit]
+
+    def reset(self):
+        self.methods.clear()
+        self.plans.clear()
+
+
+profiler = QueryProfiler()
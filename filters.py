@@ -2,12 +2,29 @@ from typing import Union
 from aiogram.filters import BaseFilter
 from aiogram.types import Message, CallbackQuery
 from config import ADMIN_IDS
+from middlewares import UserContext
+
 
 class IsAdmin(BaseFilter):
     """
     Фільтр перевіряє, чи є користувач адміністратором.
     Працює як для повідомлень (Message), так і для кнопок (CallbackQuery).
     """
-    async def __call__(self, event: Union[Message, CallbackQuery]) -> bool:
+    async def __call__(self, event: Union[Message, CallbackQuery], user_ctx: UserContext = None) -> bool:
+        # Ознаку адміна вже визначив UserContextMiddleware
+        if user_ctx is not None:
+            return user_ctx.is_admin
         # Перевіряємо ID користувача у списку адмінів
-        return event.from_user.id in ADMIN_IDS
\ No newline at end of file
+        return event.from_user.id in ADMIN_IDS
+
+
+class MenuButton(BaseFilter):
+    """
+    Фільтр натискання кнопки reply-клавіатури за канонічним ключем (наприклад, 'cart_btn').
+    Текст кнопки вже перетворив на ключ `action` UserContextMiddleware — тут лише порівняння.
+    """
+    def __init__(self, *keys: str):
+        self.keys = frozenset(keys)
+
+    async def __call__(self, message: Message, action: str = None) -> bool:
+        return action in self.keys
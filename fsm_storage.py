@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from config import FSM_TTL, FSM_FLUSH_INTERVAL, FSM_FLUSH_BATCH, FSM_SWEEP_INTERVAL
+from db_profiler import profiled_as
+
+logger = logging.getLogger(__name__)
+
+# Відсутнє значення в буфері (на відміну від state=None, що означає "скинути стан")
+_UNSET = object()
+
+
+def _dump(data: Mapping[str, Any]) -> str:
+    """Компактний JSON без пробілів і без екранування кирилиці"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-сховище в таблиці fsm_state бази магазину.
+
+    Записи буферизуються (write-behind) і скидаються однією транзакцією через
+    чергу записів БД кожні FSM_FLUSH_INTERVAL сек або при FSM_FLUSH_BATCH змінених ключах.
+    Поки запис не потрапив у БД, читання обслуговуються з буфера. Записи, не змінені
+    довше за `ttl` сек, вважаються відсутніми й видаляються фоновим прибиральником.
+    """
+
+    def __init__(self, db, ttl: float = FSM_TTL, key_builder: Optional[KeyBuilder] = None):
+        self.db = db
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # key -> [state, data_json]; _UNSET — поле не змінювалося
+        self._dirty: Dict[str, list] = {}
+        # Пакет, що зараз записується в БД (читання мають бачити і його)
+        self._flushing: Dict[str, list] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_needed = asyncio.Event()
+        self._tasks = []
+        self.flushes = 0
+        self.expired = 0
+
+    # --- Життєвий цикл ---
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._flush_loop()),
+            asyncio.create_task(self._sweep_loop()),
+        ]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.flush()
+
+    # --- Інтерфейс BaseStorage ---
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        if isinstance(state, State):
+            state = state.state
+        self._mark(self.key_builder.build(key), 0, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key), 0)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise ValueError(f"Data must be a dict, got {type(data).__name__}")
+        self._mark(self.key_builder.build(key), 1, _dump(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key), 1)
+        return json.loads(data) if data else {}
+
+    # --- Буфер ---
+    def _mark(self, skey: str, field: int, value):
+        entry = self._dirty.get(skey)
+        if entry is None:
+            entry = self._dirty[skey] = [_UNSET, _UNSET]
+        entry[field] = value
+        if len(self._dirty) >= FSM_FLUSH_BATCH:
+            self._flush_needed.set()
+
+    async def _load(self, skey: str, field: int):
+        """(state, data_json) для ключа: спершу буфери, потім БД"""
+        for buffer in (self._dirty, self._flushing):
+            entry = buffer.get(skey)
+            if entry is not None and entry[field] is not _UNSET:
+                return entry[0], entry[1]
+
+        with profiled_as('fsm_load'):
+            row = await self.db._fetchone(
+                "SELECT state, data FROM fsm_state WHERE key = ? AND updated_at >= ?",
+                (skey, int(time.time() - self.ttl))
+            )
+        if row is None:
+            return None, None
+        return row['state'], row['data']
+
+    async def flush(self):
+        """Записує всі накопичені зміни однією транзакцією"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            batch = self._flushing
+            now = int(time.time())
+            states = [(k, e[0], now) for k, e in batch.items() if e[0] is not _UNSET]
+            datas = [(k, e[1], now) for k, e in batch.items() if e[1] is not _UNSET]
+
+            async def op(conn):
+                await conn.executemany("""
+                                       INSERT INTO fsm_state (key, state, updated_at)
+                                       VALUES (?, ?, ?)
+                                       ON CONFLICT(key) DO UPDATE SET state      = excluded.state,
+                                                                      updated_at = excluded.updated_at
+                                       """, states)
+                await conn.executemany("""
+                                       INSERT INTO fsm_state (key, data, updated_at)
+                                       VALUES (?, ?, ?)
+                                       ON CONFLICT(key) DO UPDATE SET data       = excluded.data,
+                                                                      updated_at = excluded.updated_at
+                                       """, datas)
+                # Порожні записи (стан скинуто, даних немає) не зберігаємо
+                await conn.executemany(
+                    "DELETE FROM fsm_state WHERE key = ? AND state IS NULL AND data = '{}'",
+                    [(k,) for k in batch]
+                )
+
+            try:
+                with profiled_as('fsm_flush'):
+                    await self.db.writes.submit(op)
+                self.flushes += 1
+            except Exception:
+                # Повертаємо пакет у буфер, новіші зміни мають пріоритет
+                for skey, entry in batch.items():
+                    newer = self._dirty.setdefault(skey, [_UNSET, _UNSET])
+                    for field in (0, 1):
+                        if newer[field] is _UNSET:
+                            newer[field] = entry[field]
+                raise
+            finally:
+                self._flushing = {}
+
+    async def sweep(self) -> int:
+        """Видаляє записи, не змінені довше за TTL"""
+        cutoff = int(time.time() - self.ttl)
+
+        async def op(conn):
+            cursor = await conn.execute("DELETE FROM fsm_state WHERE updated_at < ?", (cutoff,))
+            return cursor.rowcount
+
+        with profiled_as('fsm_sweep'):
+            deleted = await self.db.writes.submit(op)
+        self.expired += deleted
+        return deleted
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_needed.wait(), FSM_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_needed.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"SYSTEM: FSM storage flush failed: {e}")
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(FSM_SWEEP_INTERVAL)
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info(f"SYSTEM: Expired {deleted} stale FSM entries.")
+            except Exception as e:
+                logger.error(f"SYSTEM: FSM storage sweep failed: {e}")
+
+    async def state_counts(self) -> dict:
+        """Кількість активних записів за станом (для метрик)"""
+        with profiled_as('fsm_state_counts'):
+            rows = await self.db._fetchall("""
+                                           SELECT state, COUNT(*) AS n
+                                           FROM fsm_state
+                                           WHERE state IS NOT NULL
+                                             AND updated_at >= ?
+                                           GROUP BY state
+                                           """, (int(time.time() - self.ttl),))
+        return {row['state']: row['n'] for row in rows}
+
+    def stats(self) -> dict:
+        return {
+            'dirty': len(self._dirty),
+            'flushes': self.flushes,
+            'expired': self.expired,
+        }
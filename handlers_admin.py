@@ -1,14 +1,20 @@
+import html
 import logging
-from aiogram import Bot
 from aiogram import Router, F, types
-from aiogram.filters import Command
+from aiogram.methods import SendMessage
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
+from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from database import db
-from filters import IsAdmin
+from filters import IsAdmin, MenuButton
+from middlewares import UserContext
 from keyboards import get_admin_keyboard, get_delete_item_kb, get_order_decision_kb, get_orders_list_kb
-from states import AdminAddProduct
+from states import AdminAddProduct, AdminBroadcast
 from texts import LEXICON
+from sender import sender
+from broadcast import broadcasts
+from db_profiler import profiler
 
 admin_router = Router()
 admin_router.message.filter(IsAdmin())
@@ -55,7 +61,7 @@ def get_admin_loc_data(lang='ua'):
 
 
 # ОБРОБНИК КНОПКИ АДМІН-ПАНЕЛІ
-@admin_router.message(F.text.in_([LEXICON['ua']['admin_btn'], LEXICON['en']['admin_btn']]))
+@admin_router.message(MenuButton('admin_btn'))
 @admin_router.message(Command("admin"))
 async def cmd_admin(message: types.Message):
     await message.answer("Панель адміністратора v2.0", reply_markup=get_admin_keyboard())
@@ -97,7 +103,8 @@ async def add_item_price(message: types.Message, state: FSMContext):
         await db.add_product(data['name'], data['desc'], price, data['category'])
 
         # ЛОГ: Адмін додав товар
-        logger.info(f"ADMIN_ACTION: Admin {message.from_user.id} ADDED product '{data['name']}' ({price} UAH).")
+        logger.info(f"ADMIN_ACTION: Admin {message.from_user.id} ADDED product '{data['name']}' ({price} UAH).",
+                    extra={'user_id': message.from_user.id})
 
         await message.answer(f"✅ Товар '{data['name']}' у категорії '{data['category']}' додано!",
                              reply_markup=get_admin_keyboard())
@@ -122,55 +129,151 @@ async def process_delete(callback: types.CallbackQuery):
     await db.delete_product(p_id)
 
     # ЛОГ: Адмін видалив товар
-    logger.info(f"ADMIN_ACTION: Admin {callback.from_user.id} DELETED product ID {p_id}.")
+    logger.info(f"ADMIN_ACTION: Admin {callback.from_user.id} DELETED product ID {p_id}.",
+                extra={'user_id': callback.from_user.id, 'product_id': p_id})
 
     await callback.answer("Товар видалено!")
     products = await db.get_all_products()
     await callback.message.edit_reply_markup(reply_markup=get_delete_item_kb(products))
 
-@admin_router.message(Command("orders"))
-async def cmd_view_orders_list(message: types.Message):
-    lang, _ = await db.get_user_settings(message.from_user.id)
-    loc = get_admin_loc_data(lang)
-
-    # Беремо останні 20 замовлень
-    orders_list = await db.get_orders(limit=20)
 
-    if not orders_list:
-        await message.answer(loc['empty'])
+# --- Розсилка ---
+@admin_router.message(Command("broadcast"))
+async def cmd_broadcast(message: types.Message, state: FSMContext):
+    await message.answer("Надішліть текст розсилки (підтримується форматування):")
+    await state.set_state(AdminBroadcast.waiting_for_text)
+
+
+@admin_router.message(AdminBroadcast.waiting_for_text, F.text)
+async def broadcast_text(message: types.Message, state: FSMContext):
+    await state.update_data(text=message.html_text)
+
+    builder = InlineKeyboardBuilder()
+    builder.button(text="✅ Надіслати всім", callback_data="bc_confirm")
+    builder.button(text="❌ Скасувати", callback_data="bc_abort")
+    builder.adjust(2)
+
+    await message.answer("Попередній перегляд:")
+    await message.answer(message.html_text, parse_mode="HTML", reply_markup=builder.as_markup())
+    await state.set_state(AdminBroadcast.waiting_for_confirm)
+
+
+@admin_router.callback_query(AdminBroadcast.waiting_for_confirm, F.data == "bc_confirm")
+async def broadcast_confirm(callback: types.CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await broadcasts.start(callback.from_user.id, callback.message.chat.id, data['text'])
+    await callback.answer()
+
+
+@admin_router.callback_query(AdminBroadcast.waiting_for_confirm, F.data == "bc_abort")
+async def broadcast_abort(callback: types.CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("Розсилку скасовано.")
+
+
+@admin_router.callback_query(F.data.startswith("bc_cancel_"))
+async def broadcast_cancel(callback: types.CallbackQuery):
+    broadcast_id = int(callback.data.split("_")[-1])
+    if broadcasts.cancel(broadcast_id):
+        logger.info(f"ADMIN_ACTION: Admin {callback.from_user.id} CANCELLED broadcast #{broadcast_id}.",
+                    extra={'user_id': callback.from_user.id, 'broadcast_id': broadcast_id})
+        await callback.answer("Розсилку зупинено")
+    else:
+        await callback.answer("Розсилка вже завершена")
+
+
+# --- Профілювання БД ---
+def get_dbprofile_text() -> str:
+    lines = [
+        f"<b>Профілювання БД:</b> {'увімкнено' if profiler.enabled else 'вимкнено'}, "
+        f"EXPLAIN: {'так' if profiler.explain else 'ні'}, повільні від {profiler.slow_ms:g} мс",
+    ]
+    top = profiler.top()
+    if top:
+        lines.append("\n<b>Методи (за сумарним часом):</b>")
+        for method, stats in top:
+            avg = stats.seconds * 1000 / stats.queries if stats.queries else 0
+            lines.append(f"{method}: {stats.queries} запитів, {stats.seconds * 1000:.0f} мс "
+                         f"(сер. {avg:.1f}), рядків {stats.rows}, повільних {stats.slow}")
+    scans = profiler.full_scans()
+    if scans:
+        lines.append("\n<b>Повний прохід таблиці:</b>")
+        for method, shape, details in scans[:5]:
+            lines.append(f"{method}: <code>{html.escape(shape[:200])}</code>\n→ {html.escape('; '.join(details))}")
+    lines.append("\n/dbprofile on|off · explain on|off · slow &lt;мс&gt; · reset")
+    return "\n".join(lines)
+
+
+@admin_router.message(Command("dbprofile"))
+async def cmd_dbprofile(message: types.Message, command: CommandObject):
+    args = (command.args or "").lower().split()
+    if args == ["on"] or args == ["off"]:
+        profiler.enabled = args[0] == "on"
+    elif len(args) == 2 and args[0] == "explain" and args[1] in ("on", "off"):
+        profiler.explain = args[1] == "on"
+    elif len(args) == 2 and args[0] == "slow" and args[1].replace(".", "", 1).isdigit():
+        profiler.slow_ms = float(args[1])
+    elif args == ["reset"]:
+        profiler.reset()
+    elif args:
+        await message.answer("Невідома команда. " + get_dbprofile_text())
         return
 
-    kb = get_orders_list_kb(orders_list, loc)
-    await message.answer(loc['header'], reply_markup=kb, parse_mode="HTML")
+    if args:
+        logger.info(f"ADMIN_ACTION: Admin {message.from_user.id} set DB profiler: {' '.join(args)}.",
+                    extra={'user_id': message.from_user.id})
+    await message.answer(get_dbprofile_text())
 
 
-@admin_router.callback_query(F.data == "admin_refresh_orders")
-@admin_router.callback_query(F.data == "admin_back_orders")
-async def refresh_orders_list(callback: types.CallbackQuery):
-    lang, _ = await db.get_user_settings(callback.from_user.id)
-    loc = get_admin_loc_data(lang)
+async def get_orders_screen(loc: dict, status: str = None, before_id: int = None, after_id: int = None):
+    """Текст і клавіатура однієї сторінки списку замовлень"""
+    orders_list, has_newer, has_older = await db.get_orders_page(status, before_id, after_id)
+    if not orders_list and (before_id is not None or after_id is not None):
+        # За курсором нічого не лишилося (замовлення змінили статус) — показуємо першу сторінку
+        orders_list, has_newer, has_older = await db.get_orders_page(status)
+    text = loc['header'] if orders_list else loc['empty']
+    kb = get_orders_list_kb(orders_list, loc, status, has_newer, has_older)
+    return text, kb
 
-    orders_list = await db.get_orders(limit=20)
 
-    if not orders_list:
-        await callback.message.edit_text(loc['empty'])
-        return
+@admin_router.message(Command("orders"))
+async def cmd_view_orders_list(message: types.Message, user_ctx: UserContext):
+    loc = get_admin_loc_data(user_ctx.lang)
+    text, kb = await get_orders_screen(loc)
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
 
-    kb = get_orders_list_kb(orders_list, loc)
+@admin_router.callback_query(F.data.startswith("admin_orders_"))
+@admin_router.callback_query(F.data == "admin_refresh_orders")
+@admin_router.callback_query(F.data == "admin_back_orders")
+async def refresh_orders_list(callback: types.CallbackQuery, user_ctx: UserContext):
+    loc = get_admin_loc_data(user_ctx.lang)
+
+    status, before_id, after_id = None, None, None
+    if callback.data.startswith("admin_orders_"):
+        _, _, status_key, cursor = callback.data.split("_")
+        status = None if status_key == 'all' else status_key
+        if cursor.startswith("o"):
+            before_id = int(cursor[1:])
+        elif cursor.startswith("n"):
+            after_id = int(cursor[1:])
+
+    text, kb = await get_orders_screen(loc, status, before_id, after_id)
     # Перевіряємо, чи змінився текст/клавіатура, щоб не ловити помилку "message not modified"
     try:
-        await callback.message.edit_text(loc['header'], reply_markup=kb, parse_mode="HTML")
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
     except:
         await callback.answer("Список оновлено")
 
 
 @admin_router.callback_query(F.data.startswith("view_order_"))
-async def view_single_order(callback: types.CallbackQuery):
+async def view_single_order(callback: types.CallbackQuery, user_ctx: UserContext):
     order_id = int(callback.data.split("_")[2])
 
     # Отримуємо дані для відображення
-    lang, _ = await db.get_user_settings(callback.from_user.id)
-    loc = get_admin_loc_data(lang)
+    loc = get_admin_loc_data(user_ctx.lang)
     order = await db.get_order(order_id)
 
     if not order:
@@ -208,18 +311,18 @@ async def view_single_order(callback: types.CallbackQuery):
 
 
 @admin_router.callback_query(F.data.startswith("approve_"))
-async def approve_order(callback: types.CallbackQuery, bot: Bot):
+async def approve_order(callback: types.CallbackQuery, user_ctx: UserContext):
     order_id = int(callback.data.split("_")[1])
 
     # Оновлюємо статус
     await db.update_order_status(order_id, "approved")
 
     # ЛОГ: Адмін схвалив замовлення
-    logger.info(f"ADMIN_ORDER: Admin {callback.from_user.id} APPROVED Order #{order_id}.")
+    logger.info(f"ADMIN_ORDER: Admin {callback.from_user.id} APPROVED Order #{order_id}.",
+                extra={'user_id': callback.from_user.id, 'order_id': order_id})
 
     # Локалізація відповіді адміну
-    lang, _ = await db.get_user_settings(callback.from_user.id)
-    loc = get_admin_loc_data(lang)
+    loc = get_admin_loc_data(user_ctx.lang)
 
     admin_msg = loc['approved_admin'].replace("{id}", str(order_id))
 
@@ -230,25 +333,22 @@ async def approve_order(callback: types.CallbackQuery, bot: Bot):
     # Сповіщення користувача
     order = await db.get_order(order_id)
     if order:
-        try:
-            user_lang, _ = await db.get_user_settings(order['user_id'])
-            msg_text = LEXICON[user_lang]['order_approved'].replace("{id}", str(order_id))
-            await bot.send_message(order['user_id'], msg_text)
-        except Exception as e:
-            logger.error(f"Error sending msg to user {order['user_id']}: {e}")
+        user_lang, _ = await db.get_user_settings(order['user_id'])
+        msg_text = LEXICON[user_lang]['order_approved'].replace("{id}", str(order_id))
+        sender.enqueue(SendMessage(chat_id=order['user_id'], text=msg_text))
 
 
 @admin_router.callback_query(F.data.startswith("reject_"))
-async def reject_order(callback: types.CallbackQuery, bot: Bot):
+async def reject_order(callback: types.CallbackQuery, user_ctx: UserContext):
     order_id = int(callback.data.split("_")[1])
 
     await db.update_order_status(order_id, "rejected")
 
     # ЛОГ: Адмін відхилив замовлення
-    logger.info(f"ADMIN_ORDER: Admin {callback.from_user.id} REJECTED Order #{order_id}.")
+    logger.info(f"ADMIN_ORDER: Admin {callback.from_user.id} REJECTED Order #{order_id}.",
+                extra={'user_id': callback.from_user.id, 'order_id': order_id})
 
-    lang, _ = await db.get_user_settings(callback.from_user.id)
-    loc = get_admin_loc_data(lang)
+    loc = get_admin_loc_data(user_ctx.lang)
 
     admin_msg = loc['rejected_admin'].replace("{id}", str(order_id))
 
@@ -257,9 +357,6 @@ async def reject_order(callback: types.CallbackQuery, bot: Bot):
 
     order = await db.get_order(order_id)
     if order:
-        try:
-            user_lang, _ = await db.get_user_settings(order['user_id'])
-            msg_text = LEXICON[user_lang]['order_rejected'].replace("{id}", str(order_id))
-            await bot.send_message(order['user_id'], msg_text)
-        except Exception as e:
-            logger.error(f"Error sending msg to user {order['user_id']}: {e}")
\ No newline at end of file
+        user_lang, _ = await db.get_user_settings(order['user_id'])
+        msg_text = LEXICON[user_lang]['order_rejected'].replace("{id}", str(order_id))
+        sender.enqueue(SendMessage(chat_id=order['user_id'], text=msg_text))
\ No newline at end of file
@@ -1,53 +1,63 @@
 import re
+import asyncio
 import logging
 from aiogram import Router, F, types
-from aiogram.filters import CommandStart, Command, StateFilter
+from aiogram.filters import CommandStart, Command, CommandObject, StateFilter, MagicData
 from aiogram.fsm.context import FSMContext
-from aiogram.types import LabeledPrice, PreCheckoutQuery, ContentType
+from aiogram.types import (
+    LabeledPrice, PreCheckoutQuery, ContentType,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from aiogram.methods import SendInvoice
 
-from database import db
+from database import db, LRUCache
 from texts import LEXICON
 from keyboards import (
     get_main_keyboard, get_categories_kb, get_products_kb,
     get_product_detail_kb, get_cart_kb, get_delivery_kb, get_confirm_order_kb,
-    get_order_decision_kb, get_lang_keyboard, get_settings_choice_kb, get_currency_keyboard,
-    get_checkout_step_kb
+    get_lang_keyboard, get_settings_choice_kb, get_currency_keyboard,
+    get_checkout_step_kb, get_orders_more_kb
 )
+from filters import MenuButton
 from states import OrderState
-from config import ADMIN_IDS, PAYMENT_TOKEN, EXCHANGE_RATES, CURRENCY_SIGNS
+from cart import get_cart_summary
+from order_history import render_order_history
+from search import normalize_query
+from money import to_major, format_minor
+from rates import rates
+from middlewares import UserContext
+from sender import sender
+from notifications import notifier
+from config import (
+    PAYMENT_TOKEN, CATALOG_PAGE_SIZE,
+    INLINE_RESULTS_LIMIT, INLINE_MIN_QUERY_LEN, INLINE_CACHE_TIME, INLINE_CACHE_SIZE, INLINE_CACHE_TTL
+)
 
 user_router = Router()
+# Кнопки reply-клавіатури: повідомлення без ключа кнопки (action) пропускають увесь роутер
+# однією перевіркою. Підключається раніше за user_router, щоб кнопки мали пріоритет над
+# хендлерами введення тексту в станах FSM.
+menu_router = Router()
+menu_router.message.filter(MagicData(F.action))
 logger = logging.getLogger(__name__)
 
 
-# --- ХЕЛПЕРИ ---
-async def get_user_config(user_id: int):
-    """Отримує мову, код валюти, знак валюти та курс"""
-    lang, curr_code = await db.get_user_settings(user_id)
-    rate = EXCHANGE_RATES.get(curr_code, 1)
-    sign = CURRENCY_SIGNS.get(curr_code, 'грн')
-    return lang, curr_code, sign, rate
-
-
-def convert_price(price_uah, rate):
-    return round(price_uah / rate, 2)
-
-
 # --- Старт ---
 @user_router.message(CommandStart())
 async def cmd_start(message: types.Message):
     await db.add_user(message.from_user.id)
 
     # ЛОГ: Старт бота користувачем
-    logger.info(f"USER_ACTION: User {message.from_user.id} (@{message.from_user.username}) started the bot.")
+    logger.info(f"USER_ACTION: User {message.from_user.id} (@{message.from_user.username}) started the bot.",
+                extra={'user_id': message.from_user.id})
 
     await message.answer(LEXICON['ua']['select_lang'], reply_markup=get_lang_keyboard())
 
 
 # --- НАЛАШТУВАННЯ ---
-@user_router.message(F.text.in_([LEXICON['ua']['settings_btn'], LEXICON['en']['settings_btn']]))
-async def settings_menu(message: types.Message):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+@menu_router.message(MenuButton('settings_btn'))
+async def settings_menu(message: types.Message, user_ctx: UserContext):
+    lang = user_ctx.lang
     await message.answer(LEXICON[lang]['settings_menu'], reply_markup=get_settings_choice_kb(lang))
 
 
@@ -63,14 +73,15 @@ async def show_curr_selection(callback: types.CallbackQuery):
 
 # --- Зміна Мови ---
 @user_router.callback_query(F.data.startswith("setlang_"))
-async def set_language(callback: types.CallbackQuery):
+async def set_language(callback: types.CallbackQuery, user_ctx: UserContext):
     lang_code = callback.data.split("_")[1]
     await db.set_user_language(callback.from_user.id, lang_code)
 
-    logger.info(f"USER_ACTION: User {callback.from_user.id} changed language to {lang_code}.")
+    logger.info(f"USER_ACTION: User {callback.from_user.id} changed language to {lang_code}.",
+                extra={'user_id': callback.from_user.id})
 
     await callback.message.delete()
-    is_admin = callback.from_user.id in ADMIN_IDS
+    is_admin = user_ctx.is_admin
     await callback.message.answer(
         LEXICON[lang_code]['lang_set'],
         reply_markup=get_main_keyboard(lang_code, is_admin)
@@ -79,13 +90,14 @@ async def set_language(callback: types.CallbackQuery):
 
 # --- Зміна Валюти ---
 @user_router.callback_query(F.data.startswith("setcurr_"))
-async def set_currency(callback: types.CallbackQuery):
+async def set_currency(callback: types.CallbackQuery, user_ctx: UserContext):
     curr_code = callback.data.split("_")[1]
     await db.set_user_currency(callback.from_user.id, curr_code)
-    lang, _, _, _ = await get_user_config(callback.from_user.id)
-    is_admin = callback.from_user.id in ADMIN_IDS
+    lang = user_ctx.lang
+    is_admin = user_ctx.is_admin
 
-    logger.info(f"USER_ACTION: User {callback.from_user.id} changed currency to {curr_code}.")
+    logger.info(f"USER_ACTION: User {callback.from_user.id} changed currency to {curr_code}.",
+                extra={'user_id': callback.from_user.id})
 
     await callback.message.delete()
     await callback.message.answer(
@@ -96,66 +108,51 @@ async def set_currency(callback: types.CallbackQuery):
 
 # --- Інфо та Мої Замовлення ---
 @user_router.message(Command("info"))
-@user_router.message(F.text.in_([LEXICON['ua']['info_btn'], LEXICON['en']['info_btn']]))
-async def cmd_info(message: types.Message):
-    lang, curr, sign, _ = await get_user_config(message.from_user.id)
+@menu_router.message(MenuButton('info_btn'))
+async def cmd_info(message: types.Message, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
     await message.answer(f"{LEXICON[lang]['info_msg']}\nYour Currency: {curr} ({sign})")
 
 
-@user_router.message(F.text.in_([LEXICON['ua']['orders_btn'], LEXICON['en']['orders_btn']]))
-async def cmd_my_orders(message: types.Message):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
-    orders = await db.get_user_orders(message.from_user.id)
-    is_admin = message.from_user.id in ADMIN_IDS
+async def send_order_history(message: types.Message, user_ctx: UserContext, before_id: int = None):
+    lang = user_ctx.lang
+    messages, next_cursor = await render_order_history(user_ctx.user_id, lang, before_id)
 
-    if not orders:
-        await message.answer(LEXICON[lang]['no_orders'], reply_markup=get_main_keyboard(lang, is_admin))
+    if not messages:
+        await message.answer(LEXICON[lang]['no_orders'], reply_markup=get_main_keyboard(lang, user_ctx.is_admin))
         return
 
-    loc = {
-        'ua': {
-            'status_lbl': "Статус", 'total_lbl': "Сума", 'delivery_lbl': "Доставка",
-            'paid': "✅ Оплачено", 'approved': "✅ Підтверджено", 'rejected': "❌ Скасовано",
-            'pending': "⏳ Очікується", 'Standard': "Стандарт", 'Express': "Експрес"
-        },
-        'en': {
-            'status_lbl': "Status", 'total_lbl': "Total price", 'delivery_lbl': "Delivery Method",
-            'paid': "✅ Paid", 'approved': "✅ Approved", 'rejected': "❌ Cancelled",
-            'pending': "⏳ Pending", 'Standard': "Standard", 'Express': "Express"
-        }
-    }
+    for i, text in enumerate(messages):
+        kb = None
+        if next_cursor is not None and i == len(messages) - 1:
+            kb = get_orders_more_kb(next_cursor, lang)
+        await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
+
+@menu_router.message(MenuButton('orders_btn'))
+async def cmd_my_orders(message: types.Message, user_ctx: UserContext):
+    await send_order_history(message, user_ctx)
 
-    current_loc = loc.get(lang, loc['ua'])
-    text = LEXICON[lang]['my_orders_title']
-    for o in orders:
-        status_key = o['status']
-        status_str = current_loc.get(status_key, status_key)
-        delivery_key = o['delivery_method']
-        delivery_str = current_loc.get(delivery_key, delivery_key)
-        curr_code = o['currency_code'] if o['currency_code'] else "UAH"
-
-        text += (
-            f"🆔 #{o['id']}\n"
-            f"📅 {current_loc['status_lbl']}: {status_str}\n"
-            f"💰 {current_loc['total_lbl']}: {o['total_price']} {curr_code}\n"
-            f"🚚 {current_loc['delivery_lbl']}: {delivery_str}\n"
-            f"📜 {o['items_text']}\n"
-            f"──────────────────\n"
-        )
-    await message.answer(text, parse_mode="HTML")
+
+@user_router.callback_query(F.data.startswith("my_orders_"))
+async def more_my_orders(callback: types.CallbackQuery, user_ctx: UserContext):
+    before_id = int(callback.data.split("_")[-1])
+    # Прибираємо кнопку з попереднього повідомлення, щоб її не натиснули двічі
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await send_order_history(callback.message, user_ctx, before_id)
+    await callback.answer()
 
 
 # --- Каталог ---
 @user_router.message(Command("catalog"))
-@user_router.message(F.text.in_([LEXICON['ua']['catalog_btn'], LEXICON['en']['catalog_btn']]))
+@menu_router.message(MenuButton('catalog_btn'))
 @user_router.callback_query(F.data == "back_to_menu")
-async def show_categories(message: types.Message | types.CallbackQuery):
-    user_id = message.from_user.id
-    lang, _, _, _ = await get_user_config(user_id)
+async def show_categories(message: types.Message | types.CallbackQuery, user_ctx: UserContext):
+    lang = user_ctx.lang
 
-    categories = await db.get_categories()
+    categories, version = await db.get_categories_versioned()
     text = LEXICON[lang]['choose_cat']
-    kb = get_categories_kb(categories, lang)
+    kb = get_categories_kb(categories, lang, version)
 
     if isinstance(message, types.CallbackQuery):
         await message.message.edit_text(text, reply_markup=kb)
@@ -164,40 +161,157 @@ async def show_categories(message: types.Message | types.CallbackQuery):
 
 
 @user_router.callback_query(F.data == "back_to_cats")
-async def back_to_cats_handler(callback: types.CallbackQuery):
-    lang, _, _, _ = await get_user_config(callback.from_user.id)
-    categories = await db.get_categories()
-    await callback.message.edit_text(LEXICON[lang]['choose_cat'], reply_markup=get_categories_kb(categories, lang))
+async def back_to_cats_handler(callback: types.CallbackQuery, user_ctx: UserContext):
+    lang = user_ctx.lang
+    categories, version = await db.get_categories_versioned()
+    await callback.message.edit_text(LEXICON[lang]['choose_cat'],
+                                     reply_markup=get_categories_kb(categories, lang, version))
 
 
-@user_router.callback_query(F.data.startswith("category_"))
-async def show_products_in_category(callback: types.CallbackQuery):
-    lang, curr, sign, rate = await get_user_config(callback.from_user.id)
-    category = callback.data.replace("category_", "")
+async def show_products_page(callback: types.CallbackQuery, user_ctx: UserContext, category: str,
+                             after_id: int = 0, before_id: int = None):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
 
-    products = await db.get_products_by_category(category)
+    version = db.catalog.version
+    products, has_prev, has_next = await db.get_products_page(category, after_id, before_id)
+    if version != db.catalog.version:
+        # Каталог змінився під час читання — сторінку не мемоізуємо
+        version = None
 
     if not products:
         await callback.answer(LEXICON[lang]['empty_cat'])
         return
 
+    # Курсор сторінки — id першого / останнього товару, категорія — в кінці callback_data
+    prev_page = f"catpage_p{products[0]['id']}_{category}" if has_prev else None
+    next_page = f"catpage_n{products[-1]['id']}_{category}" if has_next else None
+    page = f"p{before_id}" if before_id is not None else f"n{after_id}"
+
     cat_display = LEXICON[lang].get('categories', {}).get(category, category)
     cat_label = LEXICON[lang].get('cat_label', 'Category:')
 
     await callback.message.edit_text(
         f"{cat_label} <b>{cat_display}</b>",
-        reply_markup=get_products_kb(products, lang, sign, rate),
+        reply_markup=get_products_kb(products, lang, curr, sign, version, category, prev_page, next_page, page),
         parse_mode="HTML"
     )
 
 
+@user_router.callback_query(F.data.startswith("category_"))
+async def show_products_in_category(callback: types.CallbackQuery, user_ctx: UserContext):
+    category = callback.data.replace("category_", "")
+    await show_products_page(callback, user_ctx, category)
+
+
+@user_router.callback_query(F.data.startswith("catpage_"))
+async def paginate_category(callback: types.CallbackQuery, user_ctx: UserContext):
+    _, cursor, category = callback.data.split("_", 2)
+    cursor_id = int(cursor[1:])
+    if cursor[0] == "p":
+        await show_products_page(callback, user_ctx, category, before_id=cursor_id)
+    else:
+        await show_products_page(callback, user_ctx, category, after_id=cursor_id)
+
+
+# --- Пошук ---
+async def get_search_screen(user_ctx: UserContext, query: str, offset: int = 0):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
+    products, has_more = await db.search_products(query, offset)
+    if not products:
+        return LEXICON[lang]['search_empty'], None
+
+    page_size = len(products)
+    prev_page = f"search_{max(offset - CATALOG_PAGE_SIZE, 0)}_{query}" if offset else None
+    next_page = f"search_{offset + page_size}_{query}" if has_more else None
+    text = f"{LEXICON[lang]['search_results']} <b>{query}</b>"
+    return text, get_products_kb(products, lang, curr, sign, prev_page=prev_page, next_page=next_page)
+
+
+@user_router.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject, user_ctx: UserContext):
+    query = normalize_query(command.args)
+    if not query:
+        await message.answer(LEXICON[user_ctx.lang]['search_prompt'])
+        return
+
+    logger.info(f"USER_ACTION: User {message.from_user.id} searched for '{query}'.",
+                extra={'user_id': message.from_user.id})
+
+    text, kb = await get_search_screen(user_ctx, query)
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
+
+@user_router.callback_query(F.data.startswith("search_"))
+async def paginate_search(callback: types.CallbackQuery, user_ctx: UserContext):
+    _, offset, query = callback.data.split("_", 2)
+    text, kb = await get_search_screen(user_ctx, query, int(offset))
+    await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+
+
+# --- Inline-режим ---
+# Готові результати за ключем (запит, мова, валюта, версія каталогу, версія курсів)
+inline_cache = LRUCache(INLINE_CACHE_SIZE, INLINE_CACHE_TTL)
+# Запити, що вже виконуються: однакові запити під час набору чекають один результат
+_inline_pending: dict = {}
+
+
+async def build_inline_results(query: str, curr: str, sign: str):
+    products, _ = await db.search_products(query, limit=INLINE_RESULTS_LIMIT)
+    results = []
+    for p in products:
+        price_conv = format_minor(rates.price_minor(p['id'], p['price'], curr), curr)
+        results.append(InlineQueryResultArticle(
+            id=str(p['id']),
+            title=p['name'],
+            description=f"{price_conv} {sign}",
+            input_message_content=InputTextMessageContent(
+                message_text=f"📦 <b>{p['name']}</b>\n💰 {price_conv} {sign}",
+                parse_mode="HTML",
+            ),
+        ))
+    return tuple(results)
+
+
+async def get_inline_results(query: str, user_ctx: UserContext):
+    key = (query, user_ctx.lang, user_ctx.currency, db.catalog.version, rates.version)
+    results = inline_cache.get(key)
+    if results is not LRUCache.MISSING:
+        return results
+
+    task = _inline_pending.get(key)
+    if task is None:
+        task = asyncio.ensure_future(build_inline_results(query, user_ctx.currency, user_ctx.sign))
+        _inline_pending[key] = task
+        task.add_done_callback(lambda _: _inline_pending.pop(key, None))
+        version = inline_cache.version
+        results = await asyncio.shield(task)
+        inline_cache.put(key, results, version)
+        return results
+    return await asyncio.shield(task)
+
+
+@user_router.inline_query()
+async def inline_search(inline_query: types.InlineQuery, user_ctx: UserContext):
+    query = normalize_query(inline_query.query)
+    if len(query) < INLINE_MIN_QUERY_LEN:
+        results = ()
+    else:
+        results = await get_inline_results(query, user_ctx)
+
+    # Ціни залежать від валюти користувача, тому кеш Telegram має бути персональним
+    await inline_query.answer(list(results), cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
 @user_router.callback_query(F.data.startswith("product_"))
-async def show_product_detail(callback: types.CallbackQuery):
-    lang, curr, sign, rate = await get_user_config(callback.from_user.id)
-    product_id = int(callback.data.split("_")[1])
+async def show_product_detail(callback: types.CallbackQuery, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
+    parts = callback.data.split("_")
+    product_id = int(parts[1])
+    # Курсор сторінки категорії, з якої відкрили товар (з пошуку його немає)
+    page = parts[2] if len(parts) > 2 else None
     product = await db.get_product(product_id)
 
-    price_conv = convert_price(product['price'], rate)
+    price_conv = format_minor(rates.price_minor(product_id, product['price'], curr), curr)
     cat_display = LEXICON[lang].get('categories', {}).get(product['category'], product['category'])
 
     text = (
@@ -207,140 +321,111 @@ async def show_product_detail(callback: types.CallbackQuery):
         f"💰 {price_conv} {sign}"
     )
     await callback.message.edit_text(text,
-                                     reply_markup=get_product_detail_kb(product_id, product['category'], lang),
+                                     reply_markup=get_product_detail_kb(product_id, product['category'], lang, page),
                                      parse_mode="HTML")
 
 
 # --- Кошик ---
 @user_router.callback_query(F.data.startswith("add_cart_"))
-async def add_to_cart_handler(callback: types.CallbackQuery):
-    lang, _, _, _ = await get_user_config(callback.from_user.id)
+async def add_to_cart_handler(callback: types.CallbackQuery, user_ctx: UserContext):
+    lang = user_ctx.lang
     product_id = int(callback.data.split("_")[-1])
     await db.add_to_cart(callback.from_user.id, product_id)
 
     # ЛОГ: Додавання в кошик
-    logger.info(f"USER_ACTION: User {callback.from_user.id} added product ID {product_id} to cart.")
+    logger.info(f"USER_ACTION: User {callback.from_user.id} added product ID {product_id} to cart.",
+                extra={'user_id': callback.from_user.id, 'product_id': product_id})
 
     await callback.answer(LEXICON[lang]['added_cart'], show_alert=True)
 
 
 @user_router.message(Command("cart"))
-@user_router.message(F.text.in_([LEXICON['ua']['cart_btn'], LEXICON['en']['cart_btn']]))
-async def show_cart(message: types.Message):
-    lang, curr, sign, rate = await get_user_config(message.from_user.id)
-    cart_items = await db.get_cart(message.from_user.id)
-    is_admin = message.from_user.id in ADMIN_IDS
+@menu_router.message(MenuButton('cart_btn'))
+async def show_cart(message: types.Message, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
+    summary = await get_cart_summary(message.from_user.id, curr)
+    is_admin = user_ctx.is_admin
 
-    if not cart_items:
+    if not summary:
         await message.answer(LEXICON[lang]['cart_empty'], reply_markup=get_main_keyboard(lang, is_admin))
         return
 
-    total_uah = sum(item['price'] * item['quantity'] for item in cart_items)
-    total_conv = convert_price(total_uah, rate)
-
-    text = LEXICON[lang]['cart_title']
-    unit = "/pcs" if lang == 'en' else "/шт"
-    for item in cart_items:
-        item_price_conv = convert_price(item['price'], rate)
-        sum_item_conv = convert_price(item['price'] * item['quantity'], rate)
-
-        if item['quantity'] > 1:
-            text += f"• {item['name']} x{item['quantity']} = {sum_item_conv} {sign} ({item_price_conv}{unit})\n"
-        else:
-            text += f"• {item['name']} x{item['quantity']} = {sum_item_conv} {sign}\n"
-
-    text += f"\n💰 <b>Total: {total_conv} {sign}</b>"
-
-    await message.answer(text, reply_markup=get_cart_kb(cart_items, lang), parse_mode="HTML")
+    await message.answer(summary.render(lang, sign), reply_markup=get_cart_kb(summary.lines, lang), parse_mode="HTML")
 
 
 @user_router.callback_query(F.data.startswith("del_cart_"))
-async def delete_cart_item(callback: types.CallbackQuery):
-    lang, curr, sign, rate = await get_user_config(callback.from_user.id)
+async def delete_cart_item(callback: types.CallbackQuery, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
     cart_id = int(callback.data.split("_")[-1])
     await db.delete_from_cart(cart_id)
 
-    cart_items = await db.get_cart(callback.from_user.id)
-    if not cart_items:
+    summary = await get_cart_summary(callback.from_user.id, curr)
+    if not summary:
         await callback.message.edit_text(LEXICON[lang]['cart_empty'], reply_markup=get_cart_kb([], lang))
         return
 
-    total_uah = sum(item['price'] * item['quantity'] for item in cart_items)
-    total_conv = convert_price(total_uah, rate)
-
-    text = LEXICON[lang]['cart_title']
-    unit = "/pcs" if lang == 'en' else "/шт"
-    for item in cart_items:
-        item_price_conv = convert_price(item['price'], rate)
-        sum_item_conv = convert_price(item['price'] * item['quantity'], rate)
-
-        if item['quantity'] > 1:
-            text += f"• {item['name']} x{item['quantity']} = {sum_item_conv} {sign} ({item_price_conv}{unit})\n"
-        else:
-            text += f"• {item['name']} x{item['quantity']} = {sum_item_conv} {sign}\n"
-
-    text += f"\n💰 <b>Total: {total_conv} {sign}</b>"
-
-    await callback.message.edit_text(text, reply_markup=get_cart_kb(cart_items, lang), parse_mode="HTML")
+    await callback.message.edit_text(summary.render(lang, sign), reply_markup=get_cart_kb(summary.lines, lang),
+                                     parse_mode="HTML")
 
 
 @user_router.callback_query(F.data == "clear_cart")
-async def clear_cart_handler(callback: types.CallbackQuery):
-    lang, _, _, _ = await get_user_config(callback.from_user.id)
+async def clear_cart_handler(callback: types.CallbackQuery, user_ctx: UserContext):
+    lang = user_ctx.lang
     await db.clear_cart(callback.from_user.id)
     await callback.message.edit_text(LEXICON[lang]['cleared'])
 
-@user_router.message(StateFilter(OrderState), F.text.in_([LEXICON['ua']['cancel'], LEXICON['en']['cancel']]))
-async def cancel_order_global(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
-    is_admin = message.from_user.id in ADMIN_IDS
+@menu_router.message(StateFilter(OrderState), MenuButton('cancel'))
+async def cancel_order_global(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
+    is_admin = user_ctx.is_admin
     await state.clear()
 
-    logger.info(f"USER_ACTION: User {message.from_user.id} cancelled checkout process.")
+    logger.info(f"USER_ACTION: User {message.from_user.id} cancelled checkout process.",
+                extra={'user_id': message.from_user.id})
 
     await message.answer(LEXICON[lang]['cancelled'], reply_markup=get_main_keyboard(lang, is_admin))
 
 
 # Кнопка "Назад" для кожного кроку
-@user_router.message(OrderState.waiting_for_name, F.text.in_([LEXICON['ua']['back_step'], LEXICON['en']['back_step']]))
-async def back_from_name(message: types.Message, state: FSMContext):
-    await cancel_order_global(message, state)
+@menu_router.message(OrderState.waiting_for_name, MenuButton('back_step'))
+async def back_from_name(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    await cancel_order_global(message, state, user_ctx)
 
 
-@user_router.message(OrderState.waiting_for_phone, F.text.in_([LEXICON['ua']['back_step'], LEXICON['en']['back_step']]))
-async def back_to_name(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+@menu_router.message(OrderState.waiting_for_phone, MenuButton('back_step'))
+async def back_to_name(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     await state.set_state(OrderState.waiting_for_name)
     await message.answer(LEXICON[lang]['checkout_name'], reply_markup=get_checkout_step_kb(lang, show_back=False))
 
 
-@user_router.message(OrderState.waiting_for_address,
-                     F.text.in_([LEXICON['ua']['back_step'], LEXICON['en']['back_step']]))
-async def back_to_phone(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+@menu_router.message(OrderState.waiting_for_address,
+                     MenuButton('back_step'))
+async def back_to_phone(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     await state.set_state(OrderState.waiting_for_phone)
     await message.answer(LEXICON[lang]['checkout_phone'], reply_markup=get_checkout_step_kb(lang, show_back=True))
 
 
-@user_router.message(OrderState.waiting_for_delivery,
-                     F.text.in_([LEXICON['ua']['back_step'], LEXICON['en']['back_step']]))
-async def back_to_address(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+@menu_router.message(OrderState.waiting_for_delivery,
+                     MenuButton('back_step'))
+async def back_to_address(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     await state.set_state(OrderState.waiting_for_address)
     await message.answer(LEXICON[lang]['checkout_addr'], reply_markup=get_checkout_step_kb(lang, show_back=True))
 
 
-@user_router.message(OrderState.waiting_for_confirmation,
-                     F.text.in_([LEXICON['ua']['back_step'], LEXICON['en']['back_step']]))
-async def back_to_delivery(message: types.Message, state: FSMContext):
-    lang, _, sign, rate = await get_user_config(message.from_user.id)
+@menu_router.message(OrderState.waiting_for_confirmation,
+                     MenuButton('back_step'))
+async def back_to_delivery(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
     await state.set_state(OrderState.waiting_for_delivery)
-    await message.answer(LEXICON[lang]['checkout_method'], reply_markup=get_delivery_kb(lang, sign, rate))
+    await message.answer(LEXICON[lang]['checkout_method'], reply_markup=get_delivery_kb(lang, curr, sign))
 
 
 @user_router.callback_query(F.data == "checkout_start")
-async def start_checkout(callback: types.CallbackQuery, state: FSMContext):
-    lang, _, _, _ = await get_user_config(callback.from_user.id)
+async def start_checkout(callback: types.CallbackQuery, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     await callback.message.answer(LEXICON[lang]['checkout_name'],
                                   reply_markup=get_checkout_step_kb(lang, show_back=False))
     await state.set_state(OrderState.waiting_for_name)
@@ -348,16 +433,16 @@ async def start_checkout(callback: types.CallbackQuery, state: FSMContext):
 
 
 @user_router.message(OrderState.waiting_for_name)
-async def process_name(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+async def process_name(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     await state.update_data(user_name=message.text)
     await message.answer(LEXICON[lang]['checkout_phone'], reply_markup=get_checkout_step_kb(lang, show_back=True))
     await state.set_state(OrderState.waiting_for_phone)
 
 
 @user_router.message(OrderState.waiting_for_phone)
-async def process_phone(message: types.Message, state: FSMContext):
-    lang, _, _, _ = await get_user_config(message.from_user.id)
+async def process_phone(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang
     if not re.match(r'^\+?\d{10,15}$', message.text):
         await message.answer("⚠️ Format: +380XXXXXXXXX")
         return
@@ -367,17 +452,17 @@ async def process_phone(message: types.Message, state: FSMContext):
 
 
 @user_router.message(OrderState.waiting_for_address)
-async def process_address(message: types.Message, state: FSMContext):
-    lang, _, sign, rate = await get_user_config(message.from_user.id)
+async def process_address(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
     await state.update_data(user_address=message.text)
-    await message.answer(LEXICON[lang]['checkout_method'], reply_markup=get_delivery_kb(lang, sign, rate))
+    await message.answer(LEXICON[lang]['checkout_method'], reply_markup=get_delivery_kb(lang, curr, sign))
     await state.set_state(OrderState.waiting_for_delivery)
 
 
 @user_router.message(OrderState.waiting_for_delivery)
-async def process_delivery(message: types.Message, state: FSMContext):
-    lang, curr, sign, rate = await get_user_config(message.from_user.id)
-    is_admin = message.from_user.id in ADMIN_IDS
+async def process_delivery(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang, curr, sign = user_ctx.lang, user_ctx.currency, user_ctx.sign
+    is_admin = user_ctx.is_admin
 
     delivery_price_uah = 0
     delivery_method = "Standard"
@@ -391,25 +476,26 @@ async def process_delivery(message: types.Message, state: FSMContext):
         await message.answer("Будь ласка, оберіть спосіб доставки кнопкою.")
         return
 
-    cart_items = await db.get_cart(message.from_user.id)
-    if not cart_items:
+    summary = await get_cart_summary(message.from_user.id, curr)
+    if not summary:
         await message.answer(LEXICON[lang]['cart_empty'], reply_markup=get_main_keyboard(lang, is_admin))
         await state.clear()
         return
 
-    products_total_uah = sum(item['price'] * item['quantity'] for item in cart_items)
-    total_price_uah = products_total_uah + delivery_price_uah
+    # Сума з рядків кошика — щоб збігалася з кошиком
+    delivery_minor = rates.to_minor(delivery_price_uah, curr)
+    total_minor = summary.total_minor + delivery_minor
 
-    delivery_conv = convert_price(delivery_price_uah, rate)
-    total_conv = convert_price(total_price_uah, rate)
+    delivery_conv = format_minor(delivery_minor, curr)
+    total_conv = format_minor(total_minor, curr)
 
-    items_text = "\n".join([f"{i['name']} x{i['quantity']}" for i in cart_items])
+    items_text = summary.items_text()
 
     await state.update_data(
         delivery_method=delivery_method,
         items_text=items_text,
-        total_price_uah=total_price_uah,
-        total_price_conv=total_conv,
+        total_price_conv=to_major(total_minor, curr),
+        total_minor=total_minor,
         currency_code=curr
     )
 
@@ -433,16 +519,23 @@ async def process_delivery(message: types.Message, state: FSMContext):
     await state.set_state(OrderState.waiting_for_confirmation)
 
 
-@user_router.message(F.text.in_([LEXICON['ua']['confirm_btn'], LEXICON['en']['confirm_btn']]),
+@menu_router.message(MenuButton('confirm_btn'),
                      OrderState.waiting_for_confirmation)
-async def confirm_order(message: types.Message, state: FSMContext, bot):
-    lang, curr, sign, rate = await get_user_config(message.from_user.id)
+async def confirm_order(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang, curr = user_ctx.lang, user_ctx.currency
     data = await state.get_data()
 
-    amount_in_cents = int(data['total_price_conv'] * 100)
+    # Telegram очікує суму в мінорних одиницях валюти
+    amount_in_cents = data.get('total_minor')
+    if amount_in_cents is None:
+        # Стан оформлення, збережений до появи total_minor, — оформлюємо заново з кошика
+        await state.clear()
+        await message.answer(LEXICON[lang]['checkout_expired'])
+        await show_cart(message, user_ctx)
+        return
 
     try:
-        await bot.send_invoice(
+        await sender.send(SendInvoice(
             chat_id=message.chat.id,
             title=LEXICON[lang]['invoice_title'],
             description=LEXICON[lang]['invoice_desc'],
@@ -451,9 +544,9 @@ async def confirm_order(message: types.Message, state: FSMContext, bot):
             currency=curr,
             prices=[LabeledPrice(label="Order", amount=amount_in_cents)],
             start_parameter="create_invoice"
-        )
+        ))
     except Exception as e:
-        logger.error(f"Invoice error for user {message.from_user.id}: {e}")
+        logger.error(f"Invoice error for user {message.from_user.id}: {e}", extra={'user_id': message.from_user.id})
         await message.answer(f"Invoice Error: {e}")
 
 
@@ -463,10 +556,10 @@ async def checkout_process(pre_checkout_query: PreCheckoutQuery, bot):
 
 
 @user_router.message(F.content_type == ContentType.SUCCESSFUL_PAYMENT)
-async def successful_payment(message: types.Message, state: FSMContext, bot):
-    lang, curr, sign, _ = await get_user_config(message.from_user.id)
+async def successful_payment(message: types.Message, state: FSMContext, user_ctx: UserContext):
+    lang, curr = user_ctx.lang, user_ctx.currency
     data = await state.get_data()
-    is_admin = message.from_user.id in ADMIN_IDS
+    is_admin = user_ctx.is_admin
 
     order_data = {
         "user_id": message.from_user.id,
@@ -485,7 +578,8 @@ async def successful_payment(message: types.Message, state: FSMContext, bot):
 
     # ЛОГ: Успішна оплата та створення замовлення
     logger.info(
-        f"ORDER_NEW: Order #{order_id} PAID by User {message.from_user.id}. Total: {data['total_price_conv']} {curr}.")
+        f"ORDER_NEW: Order #{order_id} PAID by User {message.from_user.id}. Total: {data['total_price_conv']} {curr}.",
+        extra={'user_id': message.from_user.id, 'order_id': order_id})
 
     success_msg = LEXICON[lang]['success_pay'].replace("{id}", str(order_id))
 
@@ -500,11 +594,7 @@ async def successful_payment(message: types.Message, state: FSMContext, bot):
         f"💰 Сума: {data['total_price_conv']} {curr}"
     )
 
-    for admin_id in ADMIN_IDS:
-        try:
-            await bot.send_message(admin_id, admin_text, reply_markup=get_order_decision_kb(order_id),
-                                   parse_mode="HTML")
-        except Exception as e:
-            logger.error(f"Failed to send admin notification to {admin_id}: {e}")
+    summary = f"#{order_id} — {data['total_price_conv']} {curr} — {data['user_name']}"
+    notifier.new_order(order_id, admin_text, summary)
 
     await state.clear()
\ No newline at end of file
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from aiogram import Bot
+
+from config import (
+    LOOP_MONITOR_INTERVAL, LOOP_LAG_WINDOW, LOOP_STALL_THRESHOLD, READY_DB_TIMEOUT, READY_MAX_LOOP_LAG,
+    READY_MAX_SEND_QUEUE, READY_MAX_PENDING_UPDATES, READY_WEBHOOK_INFO_TTL
+)
+from database import db
+from metrics import registry, Histogram
+from sender import sender
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = registry.register(Histogram(
+    "shop_event_loop_lag_seconds", "Delay between scheduled and actual wake-up of the loop monitor"))
+
+
+def _percentile(values, p: float) -> float:
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+class LoopMonitor:
+    """
+    Затримка циклу подій: задача прокидається кожні `interval` сек і міряє, наскільки пізніше
+    запланованого вона отримала керування. Окремий потік-сторож стежить за останнім пробудженням
+    і, якщо цикл не відповідає довше `stall_threshold`, пише в лог стек потоку циклу та поточну задачу.
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, window: float = LOOP_LAG_WINDOW,
+                 stall_threshold: float = LOOP_STALL_THRESHOLD):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._lags = deque(maxlen=max(int(window / interval), 1))
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_tick = 0.0
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self.stalls = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2)
+            self._watchdog = None
+
+    async def _sample(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._last_tick = now
+            self._lags.append(lag)
+            LOOP_LAG_SECONDS.observe(value=lag)
+            if lag >= self.stall_threshold:
+                logger.warning(f"LOOP_LAG: Event loop was blocked for {lag * 1000:.0f} ms.",
+                               extra={'latency_ms': round(lag * 1000)})
+
+    # --- Потік-сторож ---
+    def _watch(self):
+        reported_tick = None
+        while not self._stopped.wait(self.stall_threshold / 2):
+            last_tick = self._last_tick
+            blocked = time.monotonic() - last_tick - self.interval
+            # Один звіт на кожне зависання: наступний — лише після нового пробудження циклу
+            if blocked >= self.stall_threshold and reported_tick != last_tick:
+                reported_tick = last_tick
+                self.stalls += 1
+                self._dump_stack(blocked)
+
+    def _dump_stack(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>"
+        task = asyncio.current_task(self._loop)
+        task_name = f"{task.get_name()} ({task.get_coro().__qualname__})" if task is not None else "callback"
+        logger.warning(f"LOOP_STALL: Event loop blocked for {blocked * 1000:.0f} ms in {task_name}:\n{stack}",
+                       extra={'latency_ms': round(blocked * 1000)})
+
+    def current_lag(self) -> float:
+        """Поточна затримка: більша з останнього виміру і часу від останнього пробудження"""
+        since_tick = time.monotonic() - self._last_tick - self.interval
+        return max(self._lags[-1] if self._lags else 0.0, since_tick, 0.0)
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            'lag_p50': _percentile(lags, 0.5),
+            'lag_p95': _percentile(lags, 0.95),
+            'lag_p99': _percentile(lags, 0.99),
+            'lag_max': lags[-1] if lags else 0.0,
+            'stalls': self.stalls,
+        }
+
+
+class ReadinessProbe:
+    """Перевірка для /ready: БД, затримка циклу, апдейти в обробці та черга відправки"""
+
+    def __init__(self, monitor: LoopMonitor):
+        self.monitor = monitor
+        self.bot = None
+        self.updates = None
+        self._pending = None
+        self._pending_at = 0.0
+
+    def setup(self, bot: Bot, updates):
+        """updates — UpdateMetricsMiddleware з лічильником апдейтів в обробці"""
+        self.bot = bot
+        self.updates = updates
+
+    async def _db_ping(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(db.ping(), READY_DB_TIMEOUT)
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+        return time.perf_counter() - start, None
+
+    async def _pending_updates(self):
+        """Апдейти, що чекають у Telegram (getWebhookInfo, з кешем)"""
+        if self.bot is None:
+            return None
+        now = time.monotonic()
+        if self._pending is None or now - self._pending_at >= READY_WEBHOOK_INFO_TTL:
+            self._pending_at = now
+            try:
+                info = await self.bot.get_webhook_info()
+                self._pending = info.pending_update_count
+            except Exception as e:
+                logger.warning(f"SYSTEM: getWebhookInfo failed in readiness check: {e}")
+        return self._pending
+
+    async def check(self) -> tuple:
+        """(готовий, звіт)"""
+        problems = []
+
+        db_latency, db_error = await self._db_ping()
+        if db_error is not None:
+            problems.append(f"db: {db_error}")
+
+        loop_lag = self.monitor.current_lag()
+        lag_p95 = self.monitor.stats()['lag_p95']
+        if max(loop_lag, lag_p95) > READY_MAX_LOOP_LAG:
+            problems.append(f"loop lag {max(loop_lag, lag_p95) * 1000:.0f} ms")
+
+        send_queue = sender.stats()['queued']
+        if send_queue > READY_MAX_SEND_QUEUE:
+            problems.append(f"send queue {send_queue}")
+
+        pending = await self._pending_updates()
+        if pending is not None and pending > READY_MAX_PENDING_UPDATES:
+            problems.append(f"pending updates {pending}")
+        in_progress = self.updates.in_progress if self.updates is not None else None
+        if in_progress is not None and in_progress > READY_MAX_PENDING_UPDATES:
+            problems.append(f"updates in progress {in_progress}")
+
+        report = {
+            'status': 'degraded' if problems else 'ok',
+            'problems': problems,
+            'db_ping_ms': round(db_latency * 1000, 2) if db_latency is not None else None,
+            'loop_lag_ms': round(loop_lag * 1000, 2),
+            'loop_lag_p95_ms': round(lag_p95 * 1000, 2),
+            'updates_in_progress': in_progress,
+            'pending_updates': pending,
+            'send_queue': send_queue,
+        }
+        return not problems, report
+
+
+loop_monitor = LoopMonitor()
+readiness = ReadinessProbe(loop_monitor)
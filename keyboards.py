@@ -1,10 +1,60 @@
+import inspect
+from functools import wraps
+
 from aiogram.types import ReplyKeyboardMarkup, InlineKeyboardMarkup
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
+from money import format_minor
+from rates import rates
 from texts import LEXICON
 
 
+# --- РЕЄСТР КЛАВІАТУР ---
+# Готові markup-об'єкти спільні для всіх апдейтів, тому змінювати їх після побудови не можна.
+def static_keyboard(func):
+    """Будує клавіатуру один раз для кожного набору параметрів (мова, прапорці)."""
+    signature = inspect.signature(func)
+    registry = {}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        markup = registry.get(bound.args)
+        if markup is None:
+            markup = registry[bound.args] = func(*bound.args)
+        return markup
+
+    wrapper.registry = registry
+    return wrapper
+
+
+class CatalogMarkupCache:
+    """Клавіатури каталогу, мемоізовані в межах однієї версії каталогу (db.catalog.version)."""
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self.version = None
+        self._items = {}
+
+    def get_or_build(self, version: int, key, build):
+        if version != self.version:
+            self._items = {}
+            self.version = version
+
+        markup = self._items.get(key)
+        if markup is None:
+            if len(self._items) >= self.maxsize:
+                self._items = {}
+            markup = self._items[key] = build()
+        return markup
+
+
+catalog_markups = CatalogMarkupCache()
+
+
 # --- НАЛАШТУВАННЯ ---
+@static_keyboard
 def get_settings_choice_kb(lang='ua') -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text=LEXICON[lang]['change_lang_btn'], callback_data="settings_lang")
@@ -13,6 +63,7 @@ def get_settings_choice_kb(lang='ua') -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@static_keyboard
 def get_lang_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="🇺🇦 Українська", callback_data="setlang_ua")
@@ -21,6 +72,7 @@ def get_lang_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@static_keyboard
 def get_currency_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="🇺🇦 UAH (Гривня)", callback_data="setcurr_UAH")
@@ -31,6 +83,7 @@ def get_currency_keyboard() -> InlineKeyboardMarkup:
 
 
 # --- Головне меню ---
+@static_keyboard
 def get_main_keyboard(lang='ua', is_admin=False) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     buttons = LEXICON[lang]['main_menu_btn']
@@ -47,7 +100,13 @@ def get_main_keyboard(lang='ua', is_admin=False) -> ReplyKeyboardMarkup:
 
 
 # --- Каталог ---
-def get_categories_kb(categories: list, lang='ua') -> InlineKeyboardMarkup:
+def get_categories_kb(categories: list, lang='ua', version: int = None) -> InlineKeyboardMarkup:
+    # Якщо передано версію каталогу, з якою прочитано categories (db.get_categories_versioned),
+    # клавіатура будується один раз на версію та мову
+    if version is not None:
+        return catalog_markups.get_or_build(version, ('categories', lang, categories),
+                                            lambda: get_categories_kb(categories, lang))
+
     builder = InlineKeyboardBuilder()
     for cat in categories:
         # Отримуємо переклад категорії, якщо його немає - залишаємо оригінал
@@ -59,24 +118,49 @@ def get_categories_kb(categories: list, lang='ua') -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_products_kb(products: list, lang='ua', currency_sign='грн', rate=1.0) -> InlineKeyboardMarkup:
+def get_products_kb(products: list, lang='ua', currency='UAH', currency_sign='грн',
+                    version: int = None, category: str = None,
+                    prev_page: str = None, next_page: str = None, page: str = None) -> InlineKeyboardMarkup:
+    """
+    prev_page / next_page — callback_data кнопок гортання сторінок (None — кнопки немає).
+    page — курсор поточної сторінки ("n<id>" / "p<id>"), щоб з картки товару повернутися на неї.
+    """
+    # Ключ кешу включає версію курсів: нові курси — нова клавіатура, без скидання кешу
+    if version is not None and category is not None:
+        return catalog_markups.get_or_build(
+            version, ('products', category, page, prev_page, next_page, lang, currency, rates.version),
+            lambda: get_products_kb(products, lang, currency, currency_sign,
+                                    prev_page=prev_page, next_page=next_page, page=page)
+        )
+
     builder = InlineKeyboardBuilder()
     for product in products:
-        price = round(product['price'] / rate, 2)
+        price = format_minor(rates.price_minor(product['id'], product['price'], currency), currency)
         builder.button(
             text=f"{product['name']} - {price} {currency_sign}",
-            callback_data=f"product_{product['id']}"
+            callback_data=f"product_{product['id']}_{page}" if page else f"product_{product['id']}"
         )
 
+    nav = []
+    if prev_page:
+        builder.button(text="⬅️", callback_data=prev_page)
+        nav.append(1)
+    if next_page:
+        builder.button(text="➡️", callback_data=next_page)
+        nav.append(1)
+
     builder.button(text=LEXICON[lang]['back_cats'], callback_data="back_to_cats")
-    builder.adjust(1)
+    # Товари по одному в ряд, стрілки гортання — в один ряд
+    builder.adjust(*([1] * len(products)), len(nav) or 1, 1)
     return builder.as_markup()
 
 
-def get_product_detail_kb(product_id: int, category: str, lang='ua') -> InlineKeyboardMarkup:
+def get_product_detail_kb(product_id: int, category: str, lang='ua', page: str = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text=LEXICON[lang]['add_cart'], callback_data=f"add_cart_{product_id}")
-    builder.button(text=LEXICON[lang]['back_cats'], callback_data=f"category_{category}")
+    # Повертаємося на сторінку категорії, з якої відкрили товар
+    back = f"catpage_{page}_{category}" if page else f"category_{category}"
+    builder.button(text=LEXICON[lang]['back_cats'], callback_data=back)
     builder.adjust(1)
     return builder.as_markup()
 
@@ -90,7 +174,7 @@ def get_cart_kb(cart_items: list, lang='ua') -> InlineKeyboardMarkup:
         return builder.as_markup()
 
     for item in cart_items:
-        builder.button(text=f"❌ {item['name']}", callback_data=f"del_cart_{item['cart_id']}")
+        builder.button(text=f"❌ {item.name}", callback_data=f"del_cart_{item.cart_id}")
 
     builder.button(text=LEXICON[lang]['cart_clear'], callback_data="clear_cart")
     builder.button(text=LEXICON[lang]['cart_checkout'], callback_data="checkout_start")
@@ -99,7 +183,14 @@ def get_cart_kb(cart_items: list, lang='ua') -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def get_orders_more_kb(before_id: int, lang='ua') -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text=LEXICON[lang]['orders_more'], callback_data=f"my_orders_{before_id}")
+    return builder.as_markup()
+
+
 # Клавіатура для етапів введення (Ім'я, Телефон, Адреса)
+@static_keyboard
 def get_checkout_step_kb(lang='ua', show_back=True) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
 
@@ -113,10 +204,10 @@ def get_checkout_step_kb(lang='ua', show_back=True) -> ReplyKeyboardMarkup:
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_delivery_kb(lang='ua', currency_sign='грн', rate=1.0) -> ReplyKeyboardMarkup:
+def get_delivery_kb(lang='ua', currency='UAH', currency_sign='грн') -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
 
-    exp_price = round(100 / rate, 2)
+    exp_price = format_minor(rates.to_minor(100, currency), currency)
 
     builder.button(text=LEXICON[lang]['delivery_std'])
     builder.button(text=f"{LEXICON[lang]['delivery_exp']} (+{exp_price} {currency_sign})")
@@ -129,6 +220,7 @@ def get_delivery_kb(lang='ua', currency_sign='грн', rate=1.0) -> ReplyKeyboar
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
 
 
+@static_keyboard
 def get_confirm_order_kb(lang='ua') -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.button(text=LEXICON[lang]['confirm_btn'])
@@ -142,6 +234,7 @@ def get_confirm_order_kb(lang='ua') -> ReplyKeyboardMarkup:
 
 
 # --- Адмінка ---
+@static_keyboard
 def get_admin_keyboard() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
     builder.button(text="/add_item")
@@ -160,20 +253,46 @@ def get_delete_item_kb(products_list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_orders_list_kb(orders_list, loc_texts) -> InlineKeyboardMarkup:
+ORDER_STATUS_ICONS = {
+    'pending': '⏳', 'paid': '✅', 'approved': '🚚', 'rejected': '❌'
+}
+
+
+def get_orders_list_kb(orders_list, loc_texts, status: str = None,
+                       has_newer=False, has_older=False) -> InlineKeyboardMarkup:
+    """
+    Список замовлень з фільтром за статусом та гортанням.
+    callback_data сторінки: admin_orders_<статус|all>_<курсор>, де курсор — 0 (перша сторінка),
+    o<id> (старіші за id) або n<id> (новіші за id).
+    """
     builder = InlineKeyboardBuilder()
+    status_key = status or 'all'
+
     for o in orders_list:
-        status_icon = {
-            'pending': '⏳', 'paid': '✅', 'approved': '🚚', 'rejected': '❌'
-        }.get(o['status'], '❓')
+        status_icon = ORDER_STATUS_ICONS.get(o['status'], '❓')
 
         currency = o['currency_code'] if o['currency_code'] else 'UAH'
 
         btn_text = f"#{o['id']} {status_icon} | {o['total_price']} {currency}"
         builder.button(text=btn_text, callback_data=f"view_order_{o['id']}")
 
-    builder.button(text="🔄 Оновити / Refresh", callback_data="admin_refresh_orders")
-    builder.adjust(1)
+    # Курсори беруться з крайніх замовлень сторінки, тож для порожньої сторінки гортання немає
+    nav = 0
+    if has_newer and orders_list:
+        builder.button(text="⬅️", callback_data=f"admin_orders_{status_key}_n{orders_list[0]['id']}")
+        nav += 1
+    if has_older and orders_list:
+        builder.button(text="➡️", callback_data=f"admin_orders_{status_key}_o{orders_list[-1]['id']}")
+        nav += 1
+
+    # Фільтр за статусом: поточний позначено крапками
+    filters = [('all', '📋')] + list(ORDER_STATUS_ICONS.items())
+    for key, icon in filters:
+        text = f"• {icon} •" if key == status_key else icon
+        builder.button(text=text, callback_data=f"admin_orders_{key}_0")
+
+    builder.button(text="🔄 Оновити / Refresh", callback_data=f"admin_orders_{status_key}_0")
+    builder.adjust(*([1] * len(orders_list)), *([nav] if nav else []), len(filters), 1)
     return builder.as_markup()
 
 
@@ -191,4 +310,18 @@ def get_order_decision_kb(order_id: int, show_actions=True) -> InlineKeyboardMar
     else:
         builder.adjust(1)
 
-    return builder.as_markup()
\ No newline at end of file
+    return builder.as_markup()
+
+
+def build_static_keyboards():
+    """Заздалегідь будує всі статичні клавіатури для кожної мови з LEXICON."""
+    get_lang_keyboard()
+    get_currency_keyboard()
+    get_admin_keyboard()
+    for lang in LEXICON:
+        get_settings_choice_kb(lang)
+        get_confirm_order_kb(lang)
+        for is_admin in (False, True):
+            get_main_keyboard(lang, is_admin)
+        for show_back in (False, True):
+            get_checkout_step_kb(lang, show_back)
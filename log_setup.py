@@ -0,0 +1,114 @@
+import json
+import logging
+import queue
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+from config import (
+    LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE, LOG_DROP_LEVEL, LOG_BLOCK_TIMEOUT,
+    LOG_ROTATE_WHEN, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+)
+
+# Поля з `extra=`, які потрапляють у JSON-подію
+EVENT_FIELDS = ('user_id', 'product_id', 'order_id', 'broadcast_id', 'latency_ms')
+
+# Тип події береться з префікса повідомлення: "ORDER_NEW: Order #5 ..." -> ORDER_NEW
+_EVENT_PREFIX_RE = re.compile(r"^([A-Z][A-Z_]+):\s*")
+
+
+class JsonFormatter(logging.Formatter):
+    """Один рядок JSON на запис: час, рівень, тип події, текст і структуровані поля"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        event = getattr(record, 'event', None)
+        if event is None:
+            match = _EVENT_PREFIX_RE.match(message)
+            if match:
+                event = match.group(1)
+                message = message[match.end():]
+
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': event,
+            'msg': message,
+        }
+        for field in EVENT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Передає записи у фоновий потік через обмежену чергу.
+
+    Форматування і запис на диск виконує QueueListener. Коли черга заповнена, записи
+    нижче `drop_level` відкидаються, а важливіші чекають місця не довше `block_timeout` сек.
+    """
+
+    def __init__(self, log_queue: queue.Queue, drop_level: int, block_timeout: float):
+        super().__init__(log_queue)
+        self.drop_level = drop_level
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Записи не серіалізуються між процесами, тож форматування лишаємо потоку-слухачу
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < self.drop_level:
+                self.dropped += 1
+                return
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        return {'dropped': self.dropped, 'queued': self.queue.qsize()}
+
+
+def _make_file_handler() -> logging.Handler:
+    if LOG_ROTATE_WHEN:
+        handler = TimedRotatingFileHandler(LOG_FILE, when=LOG_ROTATE_WHEN,
+                                           backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    else:
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                      backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging() -> tuple:
+    """
+    Налаштовує кореневий логер: у потоці подій лише постановка в чергу,
+    JSON-файл з ротацією і текстова консоль — у фоновому потоці.
+    Повертає (запущений слухач, обробник черги з лічильником відкинутих записів).
+    """
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue, LOG_DROP_LEVEL, LOG_BLOCK_TIMEOUT)
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, _make_file_handler(), console_handler, respect_handler_level=True)
+    listener.start()
+    return listener, queue_handler
@@ -1,75 +1,175 @@
 import asyncio
 import logging
-import sys
 import os
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 
-from config import BOT_TOKEN
-from handlers_user import user_router
+from log_setup import setup_logging
+from config import BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+from handlers_user import user_router, menu_router
 from handlers_admin import admin_router
 from database import db
+from middlewares import UserContextMiddleware
+from fsm_storage import SQLiteStorage
+from sender import sender
+from notifications import notifier
+from broadcast import broadcasts
+from keyboards import build_static_keyboards
+from handlers_user import inline_cache
+from metrics import registry, setup_dispatcher_metrics, ApiMetricsMiddleware
+from health import loop_monitor, readiness
+from rates import rates
 
 # --- НАЛАШТУВАННЯ ЛОГУВАННЯ ---
-log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-
-file_handler = logging.FileHandler("shop_actions.log", encoding='utf-8')
-file_handler.setFormatter(log_formatter)
-file_handler.setLevel(logging.INFO)
-
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(log_formatter)
-console_handler.setLevel(logging.INFO)
-
-logging.basicConfig(
-    level=logging.INFO,
-    handlers=[file_handler, console_handler]
-)
+# Запис логів (JSON-файл з ротацією і консоль) виконується у фоновому потоці
+log_listener, log_handler = setup_logging()
 
 logger = logging.getLogger(__name__)
 
 async def health_check(request):
     return web.Response(text="Bot is running OK")
 
-async def start_web_server():
+async def ready_check(request):
+    """Глибока перевірка: 503, якщо БД не відповідає, цикл подій зависає або черги переповнені"""
+    ready, report = await readiness.check()
+    return web.json_response(report, status=200 if ready else 503)
+
+async def metrics_handler(request):
+    return web.Response(text=await registry.render(), content_type="text/plain", charset="utf-8")
+
+def register_metrics(storage: SQLiteStorage, updates):
+    """Стан кешів, пулів і черг, що зчитується під час запиту /metrics"""
+    registry.register_stats('updates', updates.stats)
+    registry.register_stats('event_loop', loop_monitor.stats)
+    registry.register_stats('db_readers', db.readers.stats)
+    registry.register_stats('db_writer', db.writer.stats)
+    registry.register_stats('db_write_queue', db.writes.stats)
+    registry.register_stats('catalog_cache', db.catalog.stats)
+    registry.register_stats('user_cache', db.user_settings.stats)
+    registry.register_stats('inline_cache', inline_cache.stats)
+    registry.register_stats('sender', sender.stats)
+    registry.register_stats('admin_notifier', notifier.stats)
+    registry.register_stats('broadcasts', broadcasts.stats)
+    registry.register_stats('fsm_storage', storage.stats)
+    registry.register_stats('logging', log_handler.stats)
+    registry.register_gauge('shop_fsm_states', "Active FSM entries by state", 'state', storage.state_counts)
+
+async def start_web_server(dp: Dispatcher = None, bot: Bot = None):
     # Render
     port = int(os.environ.get("PORT", 8080))
     app = web.Application()
     app.router.add_get('/', health_check)
+    app.router.add_get('/ready', ready_check)
+    app.router.add_get('/metrics', metrics_handler)
+    if dp is not None:
+        # Webhook: апдейти обробляються у фоні, Telegram одразу отримує 200 OK
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=WEBHOOK_SECRET,
+        ).register(app, path=WEBHOOK_PATH)
+        setup_application(app, dp, bot=bot)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, '0.0.0.0', port)
     await site.start()
     logger.info(f"SYSTEM: Web server started on port {port}")
+    return runner
+
+async def set_webhook(bot: Bot, dp: Dispatcher) -> bool:
+    """Реєструє webhook у Telegram. False — якщо не вдалося (тоді працюємо через polling)"""
+    url = f"{WEBHOOK_URL}{WEBHOOK_PATH}"
+    try:
+        await bot.set_webhook(
+            url=url,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    except TelegramAPIError as e:
+        logger.error(f"SYSTEM: Failed to set webhook {url}: {e}. Falling back to polling.")
+        return False
+    logger.info(f"SYSTEM: Webhook set to {url}")
+    return True
 
 async def main():
-    # Створюємо таблиці в БД
+    # Затримка циклу подій і стек при зависанні — з самого старту
+    loop_monitor.start()
+
+    # Відкриваємо пул з'єднань і створюємо таблиці в БД
+    await db.connect()
     await db.create_tables()
     logger.info("SYSTEM: Database initialized successfully.")
 
-    # Запускаємо веб-сервер (ОБОВ'ЯЗКОВО для Render)
-    await start_web_server()
+    # Курси валют та попередньо обчислені ціни каталогу, далі — фонове оновлення
+    await rates.start()
+    build_static_keyboards()
 
     # Запускаємо бота
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher()
+    bot.session.middleware(ApiMetricsMiddleware())
+    # Черга вихідних повідомлень з урахуванням лімітів Telegram
+    sender.start(bot)
+    # Розсилки, перервані попередньою зупинкою, продовжуються з останньої точки
+    await broadcasts.resume()
+    # Стани FSM зберігаються в БД і переживають перезапуск
+    storage = SQLiteStorage(db)
+    await storage.start()
+    dp = Dispatcher(storage=storage)
+    updates = setup_dispatcher_metrics(dp)
+    dp.update.outer_middleware(UserContextMiddleware())
+    register_metrics(storage, updates)
+    readiness.setup(bot, updates)
 
     dp.include_router(admin_router)
+    dp.include_router(menu_router)
     dp.include_router(user_router)
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("SYSTEM: Bot started polling...")
+    # Запускаємо веб-сервер (ОБОВ'ЯЗКОВО для Render) ще до реєстрації webhook,
+    # щоб перші апдейти від Telegram не потрапили на закритий порт
+    runner = await start_web_server(dp, bot) if WEBHOOK_URL else await start_web_server()
 
-    await dp.start_polling(bot)
+    try:
+        # Webhook, якщо задано WEBHOOK_URL і Telegram його прийняв; інакше — polling
+        use_webhook = bool(WEBHOOK_URL) and await set_webhook(bot, dp)
+        if use_webhook:
+            # aiogram обробляє SIGTERM/SIGINT лише в start_polling — тут чекаємо сигналу самі,
+            # щоб завершення (черги записів, буфер FSM, розсилки) пройшло до кінця
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, stop_event.set)
+            logger.info("SYSTEM: Bot is receiving updates via webhook...")
+            await stop_event.wait()
+            logger.info("SYSTEM: Stop signal received, shutting down...")
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("SYSTEM: Bot started polling...")
+            await dp.start_polling(bot)
+    finally:
+        await runner.cleanup()
+        await broadcasts.stop()
+        await notifier.stop()
+        await sender.stop()
+        await storage.close()
+        await rates.stop()
+        await db.close()
+        logger.info("SYSTEM: Database connections closed.")
+        await loop_monitor.stop()
 
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        logger.info("SYSTEM: Bot stopped by user")
\ No newline at end of file
+        logger.info("SYSTEM: Bot stopped by user")
+    finally:
+        log_listener.stop()
\ No newline at end of file
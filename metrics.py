@@ -0,0 +1,271 @@
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+# Межі кошиків гістограм затримок (сек)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label(value) -> str:
+    """Значення мітки за форматом експозиції Prometheus: екрануються зворотна коса риска, лапки і перенесення рядка"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Лічильник з мітками. Оновлюється лише з потоку подій, тому блокування не потрібні"""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """Гістограма із заздалегідь заданими кошиками: observe — це bisect і два додавання"""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [лічильники кошиків (+Inf останній), сума, кількість]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, *labels, value: float):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labelnames + ('le',)
+        for labels, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}"
+
+
+class StatsGauges:
+    """Числові значення зі `stats()` компонентів (кеші, пули, черги), зчитуються під час запиту /metrics"""
+
+    def __init__(self, name: str, source: Callable[[], Any]):
+        self.name = name
+        self.source = source
+
+    async def collect(self):
+        stats = self.source()
+        if inspect.isawaitable(stats):
+            stats = await stats
+        lines = []
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = f"shop_{self.name}_{key}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return lines
+
+
+class LabeledGauge:
+    """Gauge з однією міткою; `source` повертає {значення мітки: число} (може бути async)"""
+
+    def __init__(self, name: str, documentation: str, labelname: str, source: Callable[[], Any]):
+        self.name = name
+        self.documentation = documentation
+        self.labelname = labelname
+        self.source = source
+
+    async def collect(self):
+        values = self.source()
+        if inspect.isawaitable(values):
+            values = await values
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label, value in values.items():
+            lines.append(f"{self.name}{_format_labels((self.labelname,), (label,))} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.gauges = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_stats(self, name: str, source: Callable[[], Any]):
+        self.gauges.append(StatsGauges(name, source))
+
+    def register_gauge(self, name: str, documentation: str, labelname: str, source: Callable[[], Any]):
+        self.gauges.append(LabeledGauge(name, documentation, labelname, source))
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for gauge in self.gauges:
+            lines.extend(await gauge.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+UPDATES_TOTAL = registry.register(Counter(
+    "shop_updates_total", "Processed updates by type", ("type",)))
+UPDATE_ERRORS_TOTAL = registry.register(Counter(
+    "shop_update_errors_total", "Updates that raised an exception, by type", ("type",)))
+HANDLER_SECONDS = registry.register(Histogram(
+    "shop_handler_seconds", "Handler execution time by handler name", ("handler",)))
+DB_METHOD_SECONDS = registry.register(Histogram(
+    "shop_db_method_seconds", "Database method latency by method name", ("method",)))
+API_SECONDS = registry.register(Histogram(
+    "shop_api_request_seconds", "Telegram Bot API request latency by method", ("method",)))
+API_ERRORS_TOTAL = registry.register(Counter(
+    "shop_api_errors_total", "Failed Telegram Bot API requests by method and error", ("method", "error")))
+
+
+# --- Джерела метрик ---
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: кількість апдейтів за типом, помилки та апдейти в обробці"""
+
+    def __init__(self):
+        self.in_progress = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type
+        UPDATES_TOTAL.inc(update_type)
+        self.in_progress += 1
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS_TOTAL.inc(update_type)
+            raise
+        finally:
+            self.in_progress -= 1
+
+    def stats(self) -> dict:
+        return {'in_progress': self.in_progress}
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: час виконання конкретного хендлера (за ім'ям функції)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get('handler')
+            name = handler_object.callback.__name__ if handler_object else 'unknown'
+            HANDLER_SECONDS.observe(name, value=time.perf_counter() - start)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сесії бота: затримка і помилки кожного запиту до Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS_TOTAL.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(name, value=time.perf_counter() - start)
+
+
+def setup_dispatcher_metrics(dp) -> UpdateMetricsMiddleware:
+    updates = UpdateMetricsMiddleware()
+    dp.update.outer_middleware(updates)
+    for event_name, observer in dp.observers.items():
+        if event_name not in ('update', 'error'):
+            observer.middleware(HandlerMetricsMiddleware())
+    return updates
+
+
+def instrument_methods(cls, histogram: Histogram, context=None):
+    """
+    Обгортає публічні async-методи класу вимірюванням часу (мітка — ім'я методу).
+    Якщо передано ContextVar `context`, на час виклику в ньому лежить ім'я методу
+    (для async-генераторів — на час кожного кроку, без вимірювання часу).
+    """
+    for name, func in list(vars(cls).items()):
+        if name.startswith('_'):
+            continue
+
+        if inspect.iscoroutinefunction(func):
+            def wrap(func, name=name):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    token = context.set(name) if context is not None else None
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        histogram.observe(name, value=time.perf_counter() - start)
+                        if token is not None:
+                            context.reset(token)
+                return wrapper
+        elif inspect.isasyncgenfunction(func) and context is not None:
+            def wrap(func, name=name):
+                @functools.wraps(func)
+                async def wrapper(*args, **kwargs):
+                    agen = func(*args, **kwargs)
+                    try:
+                        while True:
+                            token = context.set(name)
+                            try:
+                                item = await agen.__anext__()
+                            except StopAsyncIteration:
+                                return
+                            finally:
+                                context.reset(token)
+                            yield item
+                    finally:
+                        await agen.aclose()
+                return wrapper
+        else:
+            continue
+
+        setattr(cls, name, wrap(func))
@@ -0,0 +1,73 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from config import ADMIN_IDS, CURRENCY_SIGNS
+from database import db
+from rates import rates
+from texts import LEXICON
+
+# Ключі LEXICON, тексти яких є кнопками reply-клавіатур
+BUTTON_KEYS = (
+    'catalog_btn', 'cart_btn', 'orders_btn', 'info_btn', 'settings_btn', 'admin_btn',
+    'back_step', 'cancel', 'confirm_btn',
+)
+
+
+def build_button_index(lexicon: dict) -> dict:
+    """Індекс "текст кнопки будь-якою мовою" -> канонічний ключ кнопки"""
+    index = {}
+    for texts in lexicon.values():
+        for key in BUTTON_KEYS:
+            index[texts[key]] = key
+    return index
+
+
+BUTTON_INDEX = build_button_index(LEXICON)
+
+
+class UserContext:
+    """Налаштування користувача, визначені один раз на апдейт"""
+    __slots__ = ('user_id', 'lang', 'currency', 'sign', 'rate', 'is_admin')
+
+    def __init__(self, user_id: int, lang: str, currency: str, sign: str, rate: float, is_admin: bool):
+        self.user_id = user_id
+        self.lang = lang
+        self.currency = currency
+        self.sign = sign
+        self.rate = rate
+        self.is_admin = is_admin
+
+    def __repr__(self):
+        return f"UserContext(user_id={self.user_id}, lang={self.lang!r}, currency={self.currency!r})"
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """
+    Outer-middleware диспетчера: один раз на апдейт отримує мову, валюту, курс
+    та ознаку адміна і передає їх у хендлери як аргумент `user_ctx`.
+    Текст повідомлення один раз шукається в BUTTON_INDEX: ключ натиснутої кнопки
+    (або None) передається як `action`, і хендлери кнопок порівнюють лише його.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        message = getattr(event, 'message', None)
+        data['action'] = BUTTON_INDEX.get(message.text) if message is not None and message.text else None
+
+        user: User | None = data.get('event_from_user')
+        if user is not None:
+            lang, currency = await db.get_user_settings(user.id)
+            data['user_ctx'] = UserContext(
+                user_id=user.id,
+                lang=lang,
+                currency=currency,
+                sign=CURRENCY_SIGNS.get(currency, 'грн'),
+                rate=rates.rate(currency),
+                is_admin=user.id in ADMIN_IDS,
+            )
+        return await handler(event, data)
@@ -0,0 +1,185 @@
+"""Версійовані міграції схеми БД.
+
+Поточна версія схеми зберігається в таблиці `schema_version`. Кожна міграція —
+це впорядкований набір SQL-кроків, що виконується в окремій транзакції.
+Нові міграції лише додаються в кінець списку MIGRATIONS.
+
+Запуск з консолі:
+    python migrations.py status   — показати застосовані та очікувані міграції
+    python migrations.py apply    — застосувати очікувані міграції
+"""
+import argparse
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (версія, опис, SQL-кроки)
+MIGRATIONS = [
+    (1, "Hot-path indexes and unique cart(user_id, product_id)", [
+        # Перед унікальним індексом зливаємо дублікати позицій кошика в один рядок
+        """
+        UPDATE cart
+        SET quantity = (SELECT SUM(c2.quantity)
+                        FROM cart c2
+                        WHERE c2.user_id = cart.user_id
+                          AND c2.product_id = cart.product_id)
+        WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+        """,
+        "DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_user_product ON cart (user_id, product_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)",
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category)",
+    ]),
+    (2, "Orders (status, id) index for the admin order browser", [
+        # (status, id) повністю замінює індекс за status
+        "DROP INDEX IF EXISTS idx_orders_status",
+        "CREATE INDEX IF NOT EXISTS idx_orders_status_id ON orders (status, id)",
+    ]),
+    (3, "Orders (user_id, id) index for paged order history", [
+        "DROP INDEX IF EXISTS idx_orders_user",
+        "CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders (user_id, id)",
+    ]),
+    (4, "FTS5 product search index kept in sync by triggers", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5
+        (
+            name, "desc", category,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, "desc", category)
+            VALUES (new.id, new.name, new."desc", new.category);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, "desc", category)
+            VALUES ('delete', old.id, old.name, old."desc", old.category);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, "desc", category)
+            VALUES ('delete', old.id, old.name, old."desc", old.category);
+            INSERT INTO products_fts (rowid, name, "desc", category)
+            VALUES (new.id, new.name, new."desc", new.category);
+        END
+        """,
+        # Індексуємо товари, що вже є в каталозі
+        "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+    ]),
+    (5, "Persistent FSM storage", [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_state
+        (
+            key        TEXT PRIMARY KEY,
+            state      TEXT,
+            data       TEXT    NOT NULL DEFAULT '{}',
+            updated_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state (updated_at)",
+    ]),
+    (6, "Broadcast jobs and blocked-user flag", [
+        "ALTER TABLE users ADD COLUMN is_blocked INTEGER NOT NULL DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts
+        (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id   INTEGER NOT NULL,
+            chat_id    INTEGER NOT NULL,
+            message_id INTEGER,
+            text       TEXT    NOT NULL,
+            status     TEXT    NOT NULL DEFAULT 'running',
+            cursor     INTEGER NOT NULL DEFAULT 0,
+            total      INTEGER NOT NULL DEFAULT 0,
+            sent       INTEGER NOT NULL DEFAULT 0,
+            failed     INTEGER NOT NULL DEFAULT 0,
+            blocked    INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+]
+
+
+async def get_version(conn) -> int:
+    await conn.execute("""
+                       CREATE TABLE IF NOT EXISTS schema_version
+                       (
+                           version     INTEGER PRIMARY KEY,
+                           description TEXT,
+                           applied_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                       )
+                       """)
+    await conn.commit()
+    async with conn.execute("SELECT MAX(version) FROM schema_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def get_pending(conn) -> list:
+    version = await get_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+
+async def apply(conn) -> list:
+    """Застосовує всі очікувані міграції по черзі. Повертає список застосованих версій."""
+    applied = []
+    for version, description, steps in await get_pending(conn):
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            for step in steps:
+                await conn.execute(step)
+            await conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                               (version, description))
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.error(f"SYSTEM: Migration {version} ({description}) failed, rolled back.")
+            raise
+
+        logger.info(f"SYSTEM: Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+async def _cli(command: str, db_name: str):
+    from database import Database
+
+    database = Database(db_name)
+    await database.writer.open()
+    try:
+        if command == "apply":
+            # create_tables створює базові таблиці (якщо їх немає) і застосовує міграції
+            await database.create_tables()
+
+        async with database.writer.acquire() as conn:
+            version = await get_version(conn)
+
+        print(f"Database: {db_name}, schema version: {version}")
+        for m_version, description, _ in MIGRATIONS:
+            mark = "applied" if m_version <= version else "pending"
+            print(f"  [{mark}] {m_version:>3}  {description}")
+    finally:
+        await database.writer.close()
+
+
+if __name__ == "__main__":
+    from database import DB_NAME
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Shop database migrations")
+    parser.add_argument("command", choices=["status", "apply"])
+    parser.add_argument("--db", default=DB_NAME, help="шлях до файлу БД")
+    args = parser.parse_args()
+
+    asyncio.run(_cli(args.command, args.db))
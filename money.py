@@ -0,0 +1,28 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Кількість мінорних одиниць (копійок / центів) в одній одиниці валюти
+MINOR_UNITS = {
+    'UAH': 100,
+    'USD': 100,
+    'EUR': 100
+}
+
+
+def to_minor(amount_uah: int, rate, currency: str) -> int:
+    """Переводить суму в гривнях у ціле число мінорних одиниць валюти (з округленням half-up)"""
+    factor = MINOR_UNITS.get(currency, 100)
+    value = Decimal(amount_uah) * factor / Decimal(str(rate))
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_major(amount_minor: int, currency: str) -> float:
+    """Мінорні одиниці -> сума у валюті (для збереження в БД / показу)"""
+    return amount_minor / MINOR_UNITS.get(currency, 100)
+
+
+def format_minor(amount_minor: int, currency: str) -> str:
+    """Форматує суму в мінорних одиницях для показу: 226190 -> '2261.90'"""
+    factor = MINOR_UNITS.get(currency, 100)
+    digits = len(str(factor)) - 1
+    whole, fraction = divmod(amount_minor, factor)
+    return f"{whole}.{fraction:0{digits}d}" if digits else str(whole)
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram.methods import SendMessage
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from config import ADMIN_IDS, NOTIFY_CONCURRENCY, NOTIFY_DIGEST_THRESHOLD, NOTIFY_DIGEST_WINDOW
+from keyboards import get_order_decision_kb
+from sender import sender, NOTIFICATION
+
+logger = logging.getLogger(__name__)
+
+# Скільки замовлень перелічувати в одному дайджесті (ліміт довжини повідомлення)
+DIGEST_MAX_LINES = 50
+
+
+class AdminNotifier:
+    """
+    Розсилка сповіщень про нові замовлення всім адмінам у фоні.
+
+    Одночасно відправляється не більше NOTIFY_CONCURRENCY повідомлень, повтори
+    виконує планувальник відправки. Якщо за NOTIFY_DIGEST_WINDOW сек надійшло більше
+    NOTIFY_DIGEST_THRESHOLD замовлень, наступні збираються в одне повідомлення-дайджест.
+    """
+
+    def __init__(self, admin_ids=ADMIN_IDS, digest_threshold: int = NOTIFY_DIGEST_THRESHOLD,
+                 digest_window: float = NOTIFY_DIGEST_WINDOW):
+        self.admin_ids = admin_ids
+        self.digest_threshold = digest_threshold
+        self.digest_window = digest_window
+        self._slots = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+        self._recent = deque()
+        self._digest = None
+        self._digest_task = None
+        self._tasks = set()
+        self.sent = 0
+        self.failed = 0
+        self.digests = 0
+
+    def new_order(self, order_id: int, text: str, summary: str):
+        """
+        Сповіщає адмінів про замовлення, не чекаючи відправки.
+        text — повне повідомлення з кнопками рішення, summary — рядок для дайджесту.
+        """
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent and self._recent[0] < now - self.digest_window:
+            self._recent.popleft()
+
+        if self._digest is not None:
+            self._digest.append(summary)
+            return
+
+        if self.digest_threshold and len(self._recent) > self.digest_threshold:
+            logger.info(f"SYSTEM: Order peak ({len(self._recent)} in {self.digest_window}s), admin digest mode on.")
+            self._digest = [summary]
+            self._digest_task = asyncio.create_task(self._digest_later())
+            return
+
+        self._spawn(text, get_order_decision_kb(order_id))
+
+    def _spawn(self, text: str, reply_markup):
+        task = asyncio.create_task(self._fan_out(text, reply_markup))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fan_out(self, text: str, reply_markup):
+        async def deliver(admin_id):
+            async with self._slots:
+                try:
+                    await sender.send(SendMessage(chat_id=admin_id, text=text, reply_markup=reply_markup,
+                                                  parse_mode="HTML"), NOTIFICATION)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to send admin notification to {admin_id}: {e}")
+
+        await asyncio.gather(*(deliver(admin_id) for admin_id in self.admin_ids))
+
+    # --- Дайджест ---
+    async def _digest_later(self):
+        await asyncio.sleep(self.digest_window)
+        self._flush_digest()
+
+    def _flush_digest(self):
+        lines, self._digest, self._digest_task = self._digest, None, None
+        if not lines:
+            return
+        self.digests += 1
+
+        shown = lines[-DIGEST_MAX_LINES:]
+        text = f"📦 <b>Нових замовлень: {len(lines)}</b>\n\n" + "\n".join(shown)
+        if len(lines) > len(shown):
+            text += f"\n… та ще {len(lines) - len(shown)}"
+
+        builder = InlineKeyboardBuilder()
+        builder.button(text="📋 Оплачені замовлення", callback_data="admin_orders_paid_0")
+        self._spawn(text, builder.as_markup())
+
+    async def stop(self):
+        """Відправляє незавершений дайджест і чекає завершення розсилок"""
+        if self._digest_task is not None:
+            self._digest_task.cancel()
+            self._flush_digest()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            'in_progress': len(self._tasks),
+            'digest_pending': len(self._digest) if self._digest else 0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'digests': self.digests,
+        }
+
+
+notifier = AdminNotifier()
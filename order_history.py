@@ -0,0 +1,82 @@
+from contextlib import aclosing
+
+from config import ORDERS_HISTORY_PAGE_SIZE
+from database import db
+from texts import LEXICON
+
+# Максимальна довжина тексту одного повідомлення Telegram (в кодових одиницях UTF-16)
+MESSAGE_LIMIT = 4096
+# Запас до ліміту: розмітка і підрахунок на боці Telegram можуть трохи відрізнятися
+MESSAGE_BUDGET = MESSAGE_LIMIT - 96
+
+
+def utf16_len(text: str) -> int:
+    """Довжина так, як її рахує Telegram: емодзі поза BMP займають дві одиниці"""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def truncate_lines(text: str, limit: int) -> str:
+    """Обрізає текст по межі рядка, щоб не розрізати HTML-тег чи сутність"""
+    if utf16_len(text) <= limit:
+        return text
+    tail = "…\n"
+    kept, size = [], utf16_len(tail)
+    for line in text.splitlines(keepends=True):
+        line_size = utf16_len(line)
+        if size + line_size > limit:
+            break
+        kept.append(line)
+        size += line_size
+    return "".join(kept) + tail
+
+
+def render_order(o, loc: dict, limit: int = MESSAGE_BUDGET) -> str:
+    status_str = loc.get(o['status'], o['status'])
+    delivery_str = loc.get(o['delivery_method'], o['delivery_method'])
+    curr_code = o['currency_code'] if o['currency_code'] else "UAH"
+
+    block = (
+        f"🆔 #{o['id']}\n"
+        f"📅 {loc['status_lbl']}: {status_str}\n"
+        f"💰 {loc['total_lbl']}: {o['total_price']} {curr_code}\n"
+        f"🚚 {loc['delivery_lbl']}: {delivery_str}\n"
+        f"📜 {o['items_text']}\n"
+        f"──────────────────\n"
+    )
+    return truncate_lines(block, limit)
+
+
+async def render_order_history(user_id: int, lang: str, before_id: int = None,
+                               page_size: int = ORDERS_HISTORY_PAGE_SIZE):
+    """
+    Сторінка історії замовлень, розбита на повідомлення не довші за MESSAGE_BUDGET (UTF-16).
+    Рядки читаються потоково з курсора БД. Повертає (messages, next_cursor);
+    next_cursor — id для кнопки "Показати ще" або None, якщо замовлень більше немає.
+    """
+    loc = LEXICON[lang]['history']
+    messages = []
+    parts = [LEXICON[lang]['my_orders_title']] if before_id is None else []
+    size = sum(map(utf16_len, parts))
+    count, last_id, has_more = 0, None, False
+
+    # page_size + 1: зайвий рядок лише показує, що є наступна сторінка
+    async with aclosing(db.iter_user_orders(user_id, before_id, page_size + 1)) as rows:
+        async for o in rows:
+            if count == page_size:
+                has_more = True
+                break
+
+            # Заголовок іде в одному повідомленні з першим замовленням, тож воно обрізається з його урахуванням
+            block = render_order(o, loc, MESSAGE_BUDGET - size if count == 0 else MESSAGE_BUDGET)
+            block_size = utf16_len(block)
+            if size + block_size > MESSAGE_BUDGET and parts:
+                messages.append("".join(parts))
+                parts, size = [], 0
+            parts.append(block)
+            size += block_size
+            count += 1
+            last_id = o['id']
+
+    if count:
+        messages.append("".join(parts))
+    return messages, (last_id if has_more else None)
@@ -0,0 +1,127 @@
+"""Курси валют з фоновим оновленням та попередньо обчисленими цінами каталогу.
+
+Джерело курсів — провайдер з методом `fetch()`: локальний JSON-файл
+(`FileRateProvider`) або статичний словник із config. Кожне оновлення, що
+змінило курси, отримує новий номер `version` і перераховує ціну кожного товару
+в кожній валюті з CURRENCY_SIGNS. Залежні кеші (клавіатури каталогу) включають
+`version` у свій ключ, тож нові курси підхоплюються без скидання кешів.
+"""
+import asyncio
+import json
+import logging
+import os
+
+from config import EXCHANGE_RATES, CURRENCY_SIGNS, RATES_FILE, RATES_REFRESH_INTERVAL
+from database import db
+from money import to_minor
+
+logger = logging.getLogger(__name__)
+
+
+class StaticRateProvider:
+    def __init__(self, rates: dict):
+        self._rates = dict(rates)
+
+    async def fetch(self) -> dict:
+        return self._rates
+
+
+class FileRateProvider:
+    """Читає курси з JSON-файлу виду {"USD": 41.5, "EUR": 45.0}. Перечитує файл лише після зміни."""
+
+    def __init__(self, path: str, fallback: dict):
+        self.path = path
+        self._fallback = dict(fallback)
+        self._mtime = None
+        self._rates = dict(fallback)
+
+    async def fetch(self) -> dict:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return self._rates
+        if mtime != self._mtime:
+            data = await asyncio.to_thread(self._read)
+            self._rates = {**self._fallback, **data}
+            self._mtime = mtime
+        return self._rates
+
+    def _read(self) -> dict:
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+
+class ExchangeRates:
+    def __init__(self, provider):
+        self.provider = provider
+        self.version = 0
+        self.rates = {'UAH': 1}
+        # {код валюти: {id товару: ціна в мінорних одиницях}}
+        self._prices = {}
+        self._task = None
+
+    def rate(self, currency: str):
+        return self.rates.get(currency, 1)
+
+    def to_minor(self, amount_uah: int, currency: str) -> int:
+        return to_minor(amount_uah, self.rate(currency), currency)
+
+    def price_minor(self, product_id: int, price_uah: int, currency: str) -> int:
+        """Ціна товару у валюті з попередньо обчисленої таблиці (новий товар рахується і додається)"""
+        table = self._prices.setdefault(currency, {})
+        price = table.get(product_id)
+        if price is None:
+            price = table[product_id] = self.to_minor(price_uah, currency)
+        return price
+
+    async def refresh(self) -> bool:
+        """Завантажує курси. Якщо вони змінились — нова версія і перерахунок цін каталогу."""
+        fetched = await self.provider.fetch()
+        rates = {'UAH': 1}
+        for currency in CURRENCY_SIGNS:
+            value = fetched.get(currency)
+            if isinstance(value, (int, float)) and value > 0:
+                rates[currency] = value
+            elif currency in self.rates:
+                logger.error(f"SYSTEM: Invalid exchange rate for {currency}: {value!r}, keeping {self.rates[currency]}")
+                rates[currency] = self.rates[currency]
+
+        if rates == self.rates and self.version:
+            return False
+
+        products = await db.get_product_prices()
+        prices = {
+            currency: {row['id']: to_minor(row['price'], rate, currency) for row in products}
+            for currency, rate in rates.items()
+        }
+        # Підміна посилань атомарна для event loop: рендер бачить або старі, або нові таблиці
+        self.rates, self._prices = rates, prices
+        self.version += 1
+        logger.info(f"SYSTEM: Exchange rates v{self.version} loaded: {rates}")
+        return True
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(RATES_REFRESH_INTERVAL)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"SYSTEM: Exchange rates refresh failed: {e}")
+
+
+def _make_provider():
+    if RATES_FILE:
+        return FileRateProvider(RATES_FILE, EXCHANGE_RATES)
+    return StaticRateProvider(EXCHANGE_RATES)
+
+
+rates = ExchangeRates(_make_provider())
@@ -0,0 +1,25 @@
+import re
+
+# Максимум слів у пошуковому запиті та його довжина в байтах (запит передається в callback_data)
+MAX_TERMS = 6
+MAX_QUERY_BYTES = 40
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_query(text: str) -> str:
+    """Нормалізований запит: слова в нижньому регістрі через пробіл, обрізаний до MAX_QUERY_BYTES"""
+    words = []
+    size = 0
+    for word in _WORD_RE.findall((text or "").lower())[:MAX_TERMS]:
+        word_size = len(word.encode()) + (1 if words else 0)
+        if size + word_size > MAX_QUERY_BYTES:
+            break
+        words.append(word)
+        size += word_size
+    return " ".join(words)
+
+
+def build_fts_query(query: str) -> str:
+    """FTS5-вираз: кожне слово — префіксний пошук, усі слова обов'язкові ("iph pro" -> "iph"* "pro"*)"""
+    return " ".join(f'"{word}"*' for word in query.split())
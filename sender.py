@@ -0,0 +1,298 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from aiogram.methods import TelegramMethod
+
+from config import (
+    SEND_RATE, SEND_BURST, SEND_CHAT_INTERVAL, SEND_GROUP_INTERVAL,
+    SEND_CONCURRENCY, SEND_MAX_RETRIES, SEND_DRAIN_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# Пріоритети черги: менше значення — раніше відправляється
+INTERACTIVE = 0
+NOTIFICATION = 1
+BULK = 2
+
+# Ознака того, що запит до API виконує сам планувальник (щоб не рахувати його двічі)
+_scheduled = contextvars.ContextVar('scheduled_send', default=False)
+
+
+class TokenBucket:
+    """Глобальний ліміт: `rate` токенів за секунду, не більше `capacity` у запасі"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def consume(self):
+        """Списує токен без очікування (запит уже відправлено в обхід черги). Борг — не більше capacity"""
+        self._refill()
+        if self.tokens > -self.capacity:
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Зупиняє видачу токенів на `seconds` сек"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @property
+    def paused(self) -> bool:
+        return time.monotonic() < self.paused_until
+
+
+class SendJob:
+    __slots__ = ('method', 'priority', 'seq', 'chat_id', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, method: TelegramMethod, priority: int, future):
+        self.method = method
+        self.priority = priority
+        self.seq = 0
+        self.chat_id = getattr(method, 'chat_id', None)
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class SendAccountingMiddleware(BaseRequestMiddleware):
+    """
+    Запити, відправлені напряму (відповіді хендлерів), не чекають у черзі,
+    але списують токен і займають ліміт чату — черга сповіщень під них підлаштовується.
+    """
+
+    def __init__(self, scheduler: "SendScheduler"):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        if not _scheduled.get():
+            chat_id = getattr(method, 'chat_id', None)
+            if chat_id is not None:
+                self.scheduler.bucket.consume()
+                self.scheduler.mark_chat(chat_id)
+        return await make_request(bot, method)
+
+
+class SendScheduler:
+    """
+    Центральна черга вихідних запитів до Telegram.
+
+    Дотримується глобального ліміту (token bucket) і ліміту на чат, повторює запит
+    після `retry_after` від сервера та обслуговує INTERACTIVE раніше за NOTIFICATION і BULK.
+    INTERACTIVE (відповідь на дію користувача) не чекає інтервалу чату і бере токен у борг —
+    інтервал чату розносить у часі лише сповіщення та розсилки; `retry_after` діє на всіх.
+    `send` чекає результат, `enqueue` повертається одразу.
+    """
+
+    def __init__(self):
+        self.bot: Bot | None = None
+        self.bucket = TokenBucket(SEND_RATE, SEND_BURST)
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._slots = asyncio.Semaphore(SEND_CONCURRENCY)
+        self._chat_next = {}
+        # Чати, для яких Telegram повернув retry_after: до цього часу не пишемо навіть INTERACTIVE
+        self._chat_flood = {}
+        self._task = None
+        self._inflight = set()
+        # Futures викликів `send`, що ще чекають відповіді
+        self._waiting = set()
+        self._deferred = 0
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    # --- Життєвий цикл ---
+    def start(self, bot: Bot):
+        self.bot = bot
+        bot.session.middleware(SendAccountingMiddleware(self))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Дочікується відправки черги (не довше SEND_DRAIN_TIMEOUT) і зупиняє планувальник"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), SEND_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"SYSTEM: Send queue not drained, {self._pending} messages dropped.")
+        self._task.cancel()
+        for task in list(self._inflight):
+            task.cancel()
+        # Невідправлені запити: викликач `send` отримує CancelledError, а не зависає
+        for future in list(self._waiting):
+            future.cancel()
+        self._waiting.clear()
+        self._queue = asyncio.PriorityQueue()
+        self._task = None
+
+    # --- Постановка в чергу ---
+    async def send(self, method: TelegramMethod, priority: int = INTERACTIVE):
+        """Ставить запит у чергу і повертає відповідь Telegram (або піднімає помилку)"""
+        future = asyncio.get_running_loop().create_future()
+        self._put(SendJob(method, priority, future))
+        self._waiting.add(future)
+        try:
+            return await future
+        finally:
+            self._waiting.discard(future)
+
+    def enqueue(self, method: TelegramMethod, priority: int = NOTIFICATION):
+        """Ставить запит у чергу без очікування результату; помилки лише логуються"""
+        self._put(SendJob(method, priority, None))
+
+    def _put(self, job: SendJob):
+        if self._task is None:
+            raise RuntimeError("Send scheduler is not running")
+        self._pending += 1
+        self._idle.clear()
+        job.seq = next(self._seq)
+        self._queue.put_nowait((job.priority, job.seq, job))
+
+    def _defer(self, job: SendJob, delay: float):
+        """Повертає запит у чергу через `delay` сек, зберігаючи його місце серед рівних"""
+        self._deferred += 1
+
+        def requeue():
+            self._deferred -= 1
+            self._queue.put_nowait((job.priority, job.seq, job))
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    def _done(self):
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    # --- Ліміт на чат ---
+    def _chat_ready_at(self, job: SendJob) -> float:
+        if job.chat_id is None:
+            return 0
+        if job.priority == INTERACTIVE:
+            return self._chat_flood.get(job.chat_id, 0)
+        return self._chat_next.get(job.chat_id, 0)
+
+    def mark_chat(self, chat_id, pause: float = None):
+        now = time.monotonic()
+        if pause is None:
+            # Групи (від'ємний id) мають суворіший ліміт, ніж приватні чати
+            pause = SEND_GROUP_INTERVAL if isinstance(chat_id, int) and chat_id < 0 else SEND_CHAT_INTERVAL
+        else:
+            self._chat_flood[chat_id] = max(self._chat_flood.get(chat_id, 0), now + pause)
+        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0), now + pause)
+
+        if len(self._chat_next) > 10_000:
+            self._chat_next = {k: t for k, t in self._chat_next.items() if t > now}
+            self._chat_flood = {k: t for k, t in self._chat_flood.items() if t > now}
+
+    # --- Обробка ---
+    async def _run(self):
+        while True:
+            _, _, job = await self._queue.get()
+
+            delay = self._chat_ready_at(job) - time.monotonic()
+            if delay > 0:
+                self._defer(job, delay)
+                continue
+
+            if job.priority == INTERACTIVE and not self.bucket.paused:
+                self.bucket.consume()
+            else:
+                await self.bucket.acquire()
+            if job.chat_id is not None:
+                self.mark_chat(job.chat_id)
+
+            await self._slots.acquire()
+            task = asyncio.create_task(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: SendJob):
+        _scheduled.set(True)
+        job.attempts += 1
+        try:
+            result = await self.bot(job.method)
+        except TelegramRetryAfter as e:
+            if job.chat_id is not None:
+                self.mark_chat(job.chat_id, e.retry_after)
+            else:
+                self.bucket.pause(e.retry_after)
+            self._retry(job, e.retry_after, e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            self._retry(job, min(2 ** job.attempts, 30), e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.sent += 1
+            self._latencies.append(time.monotonic() - job.enqueued_at)
+            if job.future is not None and not job.future.done():
+                job.future.set_result(result)
+            self._done()
+        finally:
+            self._slots.release()
+
+    def _retry(self, job: SendJob, delay: float, error: Exception):
+        if job.attempts > SEND_MAX_RETRIES:
+            self._fail(job, error)
+            return
+        self.retried += 1
+        logger.warning(f"SYSTEM: {type(job.method).__name__} to {job.chat_id} retry in {delay}s: {error}")
+        self._defer(job, delay)
+
+    def _fail(self, job: SendJob, error: Exception):
+        self.failed += 1
+        if job.future is not None:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            logger.error(f"SYSTEM: Failed to send {type(job.method).__name__} to {job.chat_id}: {error}")
+        self._done()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else 0.0
+
+        return {
+            'queued': self._queue.qsize(),
+            'deferred': self._deferred,
+            'in_flight': len(self._inflight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+            'latency_max': latencies[-1] if latencies else 0.0,
+        }
+
+
+sender = SendScheduler()
@@ -11,4 +11,9 @@ class AdminAddProduct(StatesGroup):
     waiting_for_name = State()
     waiting_for_category = State()
     waiting_for_desc = State()
-    waiting_for_price = State()
\ No newline at end of file
+    waiting_for_price = State()
+
+
+class AdminBroadcast(StatesGroup):
+    waiting_for_text = State()
+    waiting_for_confirm = State()
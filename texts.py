@@ -27,11 +27,16 @@ LEXICON = {
         'add_cart': "🛒 У кошик",
         'added_cart': "✅ Товар додано у кошик!",
 
+        'search_prompt': "🔎 Введіть запит після команди, наприклад: /search iphone",
+        'search_results': "🔎 Результати пошуку:",
+        'search_empty': "🔎 Нічого не знайдено.",
+
         'cart_title': "<b>🛒 Ваш кошик:</b>\n\n",
         'cart_empty': "🛒 Кошик порожній.",
         'cart_clear': "🗑 Очистити кошик",
         'cart_checkout': "✅ Оформити замовлення",
         'cleared': "🗑 Кошик очищено.",
+        'checkout_expired': "⚠️ Дані замовлення застаріли, оформіть його ще раз з кошика.",
 
         # Переклад категорій
         'categories': {
@@ -71,6 +76,14 @@ LEXICON = {
 
         'my_orders_title': "📦 <b>Ваша історія замовлень:</b>\n\n",
         'no_orders': "У вас поки немає замовлень.",
+        'orders_more': "⬇️ Показати ще",
+
+        # Історія замовлень
+        'history': {
+            'status_lbl': "Статус", 'total_lbl': "Сума", 'delivery_lbl': "Доставка",
+            'paid': "✅ Оплачено", 'approved': "✅ Підтверджено", 'rejected': "❌ Скасовано",
+            'pending': "⏳ Очікується", 'Standard': "Стандарт", 'Express': "Експрес"
+        },
 
         'order_approved': "🎉 Ваше замовлення #{id} підтверджено і передано в доставку!",
         'order_rejected': "😔 Вибачте, замовлення #{id} було скасовано адміністратором.",
@@ -103,11 +116,16 @@ LEXICON = {
         'add_cart': "🛒 Add to Cart",
         'added_cart': "✅ Added to cart!",
 
+        'search_prompt': "🔎 Type your query after the command, e.g.: /search iphone",
+        'search_results': "🔎 Search results:",
+        'search_empty': "🔎 Nothing found.",
+
         'cart_title': "<b>🛒 Your Cart:</b>\n\n",
         'cart_empty': "🛒 Cart is empty.",
         'cart_clear': "🗑 Clear Cart",
         'cart_checkout': "✅ Checkout",
         'cleared': "🗑 Cart cleared.",
+        'checkout_expired': "⚠️ Your order details are out of date, please check out again from the cart.",
 
         # Categories translation
         'categories': {
@@ -147,6 +165,14 @@ LEXICON = {
 
         'my_orders_title': "📦 <b>Your Order History:</b>\n\n",
         'no_orders': "You have no orders yet.",
+        'orders_more': "⬇️ Load more",
+
+        # Order history
+        'history': {
+            'status_lbl': "Status", 'total_lbl': "Total price", 'delivery_lbl': "Delivery Method",
+            'paid': "✅ Paid", 'approved': "✅ Approved", 'rejected': "❌ Cancelled",
+            'pending': "⏳ Pending", 'Standard': "Standard", 'Express': "Express"
+        },
 
         'order_approved': "🎉 Your order #{id} has been confirmed and shipped!",
         'order_rejected': "😔 Sorry, your order #{id} has been cancelled by admin.",